@@ -0,0 +1,144 @@
+from src.coverers.data_structs import *
+from src.coverers.wedgecover import *
+import numpy as np
+import collections
+import hashlib
+import os
+
+# arrays of an .npz cover file, files without all of them were written by an older CoverCache and are solved again
+STORED_ARRAYS = ('ranges', 'apexZ0', 'end_layer', 'patches', 'real_patch_list', 'n_patches', 'n_discarded_patches', 'white_space_steps')
+
+# content hashes of data files, keyed by (path, size, modification time) so each file is hashed once
+file_hashes = {}
+
+def fileHash(filepath):
+    # sha1 of the contents of a data file
+    stat = os.stat(filepath)
+    key = (os.path.abspath(filepath), stat.st_size, stat.st_mtime)
+    if key not in file_hashes:
+        sha = hashlib.sha1()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        file_hashes[key] = sha.hexdigest()
+    return file_hashes[key]
+
+class CoverCache():
+    """Remembers solved covers so that solving the same wedge with the same parameters again
+    only rebuilds the patches from their superpoint hit ranges
+
+    Covers are keyed by (data file hash, wedge index, lining, apexZ0, ppl, top_layer_cutoff,
+    beam_axis_lim, leftRight). The most recently used maxsize covers are kept in memory, and if
+    a directory is given every cover is also written there as an .npz file, so the cache
+    carries over between runs.
+
+    A restored cover has the patches, all_patches, real_patch_list, end_layer of every patch,
+    n_patches, n_discarded_patches and white_space_steps of the solved cover. Scratch state of
+    the solver (the shadows of the last getShadows of a patch), fitting_lines, which solve only
+    makes with show, and stats are not restored.
+    """
+
+    def __init__(self, maxsize:int = 4096, directory:str = None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.covers = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, filepath, wedge:int, lining:str, apexZ0, ppl:int, env:Environment, leftRight:bool = True):
+        # a scalar apexZ0 and a list of one apexZ0 are kept apart since solve treats them differently
+        apexZ0s = tuple(np.atleast_1d(np.asarray(apexZ0, dtype=float)).tolist())
+        return (fileHash(filepath), int(wedge), lining, np.ndim(apexZ0), apexZ0s, int(ppl),
+                float(env.top_layer_lim), float(env.beam_axis_lim), bool(leftRight))
+
+    def solve(self, env:Environment, data:DataSet, filepath, wedge:int, lining:str = "makePatches_Projective", apexZ0 = 0, ppl:int = 16, leftRight:bool = True):
+        """Same as wedgeCover(env, data).solve(..., show = False), through the cache
+
+        Args:
+            env (Environment): environment of the wedge
+            data (DataSet): hits of the wedge, with the boundary points already added
+            filepath (str): data file the wedge was read from
+            wedge (int): index of the wedge in the file
+
+        Returns:
+            wedgeCover: the solved cover
+        """
+        key = self.key(filepath, wedge, lining, apexZ0, ppl, env, leftRight)
+        stored = self.get(key)
+        if stored is not None:
+            self.hits += 1
+            return self.restore(env, data, stored)
+
+        self.misses += 1
+        cover = wedgeCover(env, data)
+        cover.solve(apexZ0 = apexZ0, lining=lining, ppl = ppl, leftRight=leftRight, show = False)
+        self.put(key, self.store(cover))
+        return cover
+
+    def store(self, cover:wedgeCover):
+        # the hit ranges and end layers of the superpoints of all patches, which of them are real, and the counters of the cover
+        # open ended ranges like (None, ppl) are stored as the absolute hit indices they slice
+        all_patches = cover.all_patches
+        ranges = np.array([[slice(sp.start, sp.stop).indices(len(cover.data.z[sp.layer]))[:2] for sp in patch.superpoints] for patch in all_patches], dtype=np.int64)
+        patch_index = {id(patch): i for i, patch in enumerate(all_patches)}
+        return {'ranges': ranges.reshape(-1, cover.env.num_layers, 2),
+                'apexZ0': [patch.apexZ0 for patch in all_patches],
+                'end_layer': np.array([patch.end_layer for patch in all_patches], dtype=np.int64),
+                'patches': np.array([patch_index[id(patch)] for patch in cover.patches], dtype=np.int64),
+                'real_patch_list': np.array(cover.real_patch_list, dtype=bool),
+                'n_patches': cover.n_patches,
+                'n_discarded_patches': cover.n_discarded_patches,
+                'white_space_steps': np.array([[column['steps'], column['evaluations']] for column in cover.white_space_steps], dtype=np.int64).reshape(-1, 2)}
+
+    def restore(self, env:Environment, data:DataSet, stored:dict):
+        # rebuilds the cover on data, after the same removal of identical z that solve does
+        for row in range(env.num_layers):
+            data.removeIdenticalZ(row)
+
+        cover = wedgeCover(env, data)
+        cover.all_patches = patchesFromRanges(env, data, stored['ranges'], stored['apexZ0'])
+        for patch, end_layer in zip(cover.all_patches, stored['end_layer'].tolist()):
+            patch.add_end(end_layer)
+        cover.patches = [cover.all_patches[i] for i in stored['patches']]
+        cover.real_patch_list = stored['real_patch_list'].tolist()
+        cover.n_patches = int(stored['n_patches'])
+        cover.n_discarded_patches = int(stored['n_discarded_patches'])
+        cover.white_space_steps = [{'steps': steps, 'evaluations': evaluations} for steps, evaluations in stored['white_space_steps'].tolist()]
+        return cover
+
+    def get(self, key):
+        if key in self.covers:
+            self.covers.move_to_end(key)
+            return self.covers[key]
+        path = self.path(key)
+        if (path is not None) and os.path.exists(path):
+            with np.load(path) as f:
+                if not set(STORED_ARRAYS).issubset(f.files):
+                    return None
+                stored = {name: f[name] for name in f.files}
+            stored['apexZ0'] = stored['apexZ0'].tolist()
+            self.remember(key, stored)
+            return stored
+        return None
+
+    def put(self, key, stored:dict):
+        self.remember(key, stored)
+        path = self.path(key)
+        if path is not None:
+            np.savez(path, ranges=stored['ranges'], apexZ0=np.asarray(stored['apexZ0'], dtype=float), end_layer=stored['end_layer'],
+                     patches=stored['patches'], real_patch_list=stored['real_patch_list'], n_patches=stored['n_patches'],
+                     n_discarded_patches=stored['n_discarded_patches'], white_space_steps=stored['white_space_steps'])
+
+    def remember(self, key, stored:dict):
+        # least recently used covers are dropped from memory first
+        self.covers[key] = stored
+        self.covers.move_to_end(key)
+        while len(self.covers) > self.maxsize:
+            self.covers.popitem(last=False)
+
+    def path(self, key):
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + '.npz')
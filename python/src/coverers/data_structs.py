@@ -1,5 +1,6 @@
 import numpy as np 
 import matplotlib.pyplot as plt
+import collections
 from src.debug import * 
 
 class Point:
@@ -36,40 +37,270 @@ class Environment:
         # parallelogram slopes represent dz1/dz5 in z1-z5 space
         self.parallelogramSlopes = [(self.radii[0]-Rj)/(self.radii[-1] - Rj) for Rj in self.radii[:-1]]
         self.radii_leverArm = [1 - pSlope for pSlope in self.parallelogramSlopes]
+        # lever arms (r_k - r_i)/(r_j - r_i) of straight lines through layers i and j projected to layer k, 
+        # indexed [i, j, k] with 0 the beam axis and 1 to num_layers the layers, inf or nan where i == j. 
+        # leverArmTable has the same numbers as nested lists, which are faster to index one at a time
+        layer_radii = np.array([0.] + self.radii)
+        with np.errstate(divide='ignore', invalid='ignore'): 
+            self.leverArms = (layer_radii[None, None, :] - layer_radii[:, None, None]) / (layer_radii[None, :, None] - layer_radii[:, None, None])
+        self.leverArmTable = self.leverArms.tolist()
 
         self.boundaryPoint_offset = 0
         self.trapezoid_edges = np.array(self.radii)*(self.top_layer_lim-self.beam_axis_lim)/(self.radii[-1]) + self.beam_axis_lim
         
 
+def closestIndex(sorted_z, z_value): 
+    """Finds the hit closest to z_value in a layer sorted by z with a binary search
+
+    Gives the same index as np.argmin(np.abs(sorted_z - z_value)), including the
+    choice of the lowest index on ties, in O(log N) instead of O(N).
+
+    Args:
+        sorted_z (np.ndarray): z values sorted in ascending order
+        z_value (float): z value to look up
+
+    Returns:
+        int: index of the closest hit
+    """
+    index = int(np.searchsorted(sorted_z, z_value))
+    if (index == len(sorted_z)) or ((index > 0) and (abs(sorted_z[index-1] - z_value) <= abs(sorted_z[index] - z_value))): 
+        index -= 1
+        # step back over hits at the same distance so the lowest index wins like in argmin
+        distance = abs(sorted_z[index] - z_value)
+        while (index > 0) and (abs(sorted_z[index-1] - z_value) == distance): 
+            index -= 1
+    return index
+
+def closestIndices(sorted_z, z_values): 
+    """Vectorized closestIndex, looks up the closest hit for every value of z_values at once
+
+    Args:
+        sorted_z (np.ndarray): z values sorted in ascending order
+        z_values (np.ndarray): z values to look up
+
+    Returns:
+        np.ndarray: index of the closest hit for each z value
+    """
+    z_values = np.asarray(z_values, dtype=float)
+    indices = np.searchsorted(sorted_z, z_values)
+    below = np.clip(indices - 1, 0, len(sorted_z) - 1)
+    above = np.clip(indices, 0, len(sorted_z) - 1)
+    step_back = (indices == len(sorted_z)) | ((indices > 0) & (np.abs(sorted_z[below] - z_values) <= np.abs(sorted_z[above] - z_values)))
+    indices = np.where(step_back, below, indices)
+    # the rare values with another hit at the same distance further left take the scalar path for argmin's choice
+    previous = np.maximum(indices - 1, 0)
+    for i in np.flatnonzero(step_back & (indices > 0) & (np.abs(sorted_z[previous] - z_values) == np.abs(sorted_z[indices] - z_values))): 
+        indices[i] = closestIndex(sorted_z, z_values[i])
+    return indices
+
+def straightLineProjections(env:Environment, z_i, z_j, i, j, k): 
+    """Vectorized wedgePatch.straightLineProjectorFromLayerIJtoK, projects the lines through z_i on layer i 
+    and z_j on layer j to layer k for arrays of z values and layers, broadcast against each other
+
+    Args:
+        env (Environment): environment with the lever arms of the layers
+        z_i (np.ndarray): z values on layer i
+        z_j (np.ndarray): z values on layer j
+        i (int or np.ndarray): layers of z_i, 0 is the beam axis
+        j (int or np.ndarray): layers of z_j, 0 is the beam axis
+        k (int or np.ndarray): layers to project to, 0 is the beam axis
+
+    Returns:
+        np.ndarray: z values on layer k
+    """
+    z_i = np.asarray(z_i, dtype=float)
+    return z_i + (np.asarray(z_j, dtype=float) - z_i) * env.leverArms[i, j, k]
+
+# number of apexZ0 whose lambdaZ index a DataSet keeps
+LAMBDAZ_CACHE_SIZE = 16
+
 class DataSet(): 
     
     def __init__(self, env:Environment): 
         self.env = env 
-        self.array = [[] for _ in range(env.num_layers)]
+        # hits are stored column-wise: for each layer a contiguous array per attribute, sorted by z
+        self.z = [np.empty(0) for _ in range(env.num_layers)]
+        self.phi = [np.empty(0) for _ in range(env.num_layers)]
+        self.radius = [np.empty(0) for _ in range(env.num_layers)]
+        self.layer_num = [np.empty(0, dtype=int) for _ in range(env.num_layers)]
         self.n_points = [0 for _ in range(env.num_layers)]
         self.total_points = 0
+        # True for the layers with hits of identical z, which removeIdenticalZ takes care of
+        self.identical_z = [False for _ in range(env.num_layers)]
+        # Point objects are only built when array is accessed
+        self._array = None
+        # hit indices closest to the trapezoid edges, keyed by (layer, edge)
+        self._edge_indices = {}
+        # per-layer lambdaZ arrays of the most recently used apexZ0, see lambdaZIndex
+        self._lambdaZ = collections.OrderedDict()
+
+    @property
+    def array(self): 
+        # per-layer lists of Point objects, created lazily from the columns 
+        if self._array is None: 
+            self._array = [[Point(*hit) for hit in zip(self.layer_num[ln].tolist(), 
+                                                        self.radius[ln].tolist(), 
+                                                        self.phi[ln].tolist(), 
+                                                        self.z[ln].tolist())]
+                           for ln in range(self.env.num_layers)]
+        return self._array
+
+    def points(self, layer:int, start:int, stop:int): 
+        # Point views of hits start:stop (python slice semantics) of a layer
+        return self.array[layer][start:stop]
         
     def importData(self, data_array:list): 
         # puts a list of Point objects into DataSet structure
         
         # data array should be a (uniterated) list of Point objects 
-        self.total_points = len(data_array) 
+        # or an (N, 4) array of layer, r, phi, z as given by reader.parseLines
+        if isinstance(data_array, np.ndarray): 
+            self.importArrays(data_array[:, 0], data_array[:, 1], data_array[:, 2], data_array[:, 3])
+            return
+        self.importArrays(np.array([point.layer_num for point in data_array], dtype=int), 
+                          np.array([point.radius for point in data_array], dtype=float), 
+                          np.array([point.phi for point in data_array], dtype=float), 
+                          np.array([point.z for point in data_array], dtype=float))
+
+    def importArrays(self, layer_num, radius, phi, z): 
+        # puts flat hit columns (layer numbers 1~num_layers) into DataSet structure
+        # hits of identical z are separated right away, so solving the data does not have to
+        layer_num = np.asarray(layer_num, dtype=int)
+        self.total_points = len(layer_num) 
+
+        for ln in range(self.env.num_layers): 
+            in_layer = np.flatnonzero(layer_num == ln + 1)
+            self.setLayer(ln, layer_num[in_layer], radius[in_layer], phi[in_layer], z[in_layer])
+            self.removeIdenticalZ(ln)
+
+    def setLayer(self, ln:int, layer_num, radius, phi, z): 
+        # stores the hits of one layer, stable sorted by z like list.sort 
+        order = np.argsort(z, kind='stable')
+        self.z[ln] = np.ascontiguousarray(np.asarray(z, dtype=float)[order])
+        self.phi[ln] = np.ascontiguousarray(np.asarray(phi, dtype=float)[order])
+        self.radius[ln] = np.ascontiguousarray(np.asarray(radius, dtype=float)[order])
+        self.layer_num[ln] = np.ascontiguousarray(np.asarray(layer_num, dtype=int)[order])
+        self.n_points[ln] = len(order)
+        self.identical_z[ln] = bool(np.any(self.z[ln][1:] == self.z[ln][:-1]))
+        self._array = None
+        self._edge_indices = {}
+        self._lambdaZ = collections.OrderedDict()
+
+    def indexFromZ(self, ln:int, z_value:float, alignment = 'closest'): 
+        """Looks up the hit of a layer closest to a z value
+
+        Args:
+            ln (int): layer index
+            z_value (float): z value to look up
+            alignment (str, optional): 'closest' gives the closest hit, 'above' the closest hit if it 
+                is above z_value and the next one otherwise, 'below' the closest hit if it is below 
+                z_value and the previous one otherwise. Defaults to 'closest'.
+
+        Returns:
+            int: hit index
+        """
+        layer_z = self.z[ln]
+        index = closestIndex(layer_z, z_value)
+        if alignment == 'closest':
+            return index
         
-        for point in data_array: 
-            self.array[point.layer_num - 1].append(point)
+        if alignment == 'above':
+            if layer_z[index] > z_value:
+                return index
+            else:
+                return index + 1
             
-        ln = 0
-        for layer in self.array: 
-            layer.sort(key=lambda point: point.z) 
-            self.n_points[ln] = len(layer)
-            ln += 1
+        if alignment == 'below':
+            if layer_z[index] < z_value:
+                return index
+            else:
+                return index - 1
+
+    def trapezoidBounds(self, ln:int, edge:float): 
+        # indices of the hits closest to -edge and +edge of a layer, computed once per layer and edge
+        key = (ln, edge)
+        if key not in self._edge_indices: 
+            self._edge_indices[key] = (closestIndex(self.z[ln], -edge), closestIndex(self.z[ln], edge))
+        return self._edge_indices[key]
+
+    def lambdaZIndex(self, apexZ0:float): 
+        """Rescaled hit positions lambdaZ = (z-apexZ0)/r of every layer for one apexZ0
+
+        The arrays are computed once per apexZ0 and shared by everything that projects hits 
+        from that apexZ0, the LAMBDAZ_CACHE_SIZE most recently used apexZ0 are kept. Like the 
+        layers they are sorted in ascending order.
+
+        Args:
+            apexZ0 (float): z of the point on the beam axis the hits are projected from
+
+        Returns:
+            list: one lambdaZ array per layer
+        """
+        key = float(apexZ0)
+        if key in self._lambdaZ: 
+            self._lambdaZ.move_to_end(key)
+        else: 
+            self._lambdaZ[key] = [(self.z[ln]-apexZ0)/(self.env.radii[ln]) for ln in range(self.env.num_layers)]
+            if len(self._lambdaZ) > LAMBDAZ_CACHE_SIZE: 
+                self._lambdaZ.popitem(last=False)
+        return self._lambdaZ[key]
+
+    def hasLambdaZ(self, apexZ0:float): 
+        # True if the lambdaZ index of apexZ0 is already computed
+        return float(apexZ0) in self._lambdaZ
+
+    def lambdaZ(self, ln:int, apexZ0:float): 
+        # sorted lambdaZ = (z-apexZ0)/r of the hits of a layer
+        return self.lambdaZIndex(apexZ0)[ln]
+
+    def closestLambdaZ(self, ln:int, apexZ0:float, lambdaZ): 
+        """Looks up the hits of a layer closest to lines from apexZ0 with slopes lambdaZ
+
+        Args:
+            ln (int): layer index
+            apexZ0 (float): z of the point on the beam axis the lines start from
+            lambdaZ (float or np.ndarray): rescaled position (z-apexZ0)/r of the lines
+
+        Returns:
+            int or np.ndarray: index of the closest hit, one per value if lambdaZ is an array
+        """
+        if np.ndim(lambdaZ) == 0: 
+            return closestIndex(self.lambdaZ(ln, apexZ0), lambdaZ)
+        return closestIndices(self.lambdaZ(ln, apexZ0), lambdaZ)
+
+    def removeIdenticalZ(self, ln:int, epsilon = 0.00001): 
+        """Shifts hits that share a z value with their left neighbour until all z in the layer differ
+
+        Each pass goes through the layer once, shifting z[x+1] by epsilon whenever it equals z[x] 
+        (after z[x] itself may have been shifted), and then re-sorts the layer. The passes are 
+        vectorized: hit x+1 is shifted if hit x kept its z and z[x] == z[x+1], or if hit x was 
+        shifted and z[x]+epsilon == z[x+1], so a hit is shifted when the number of identical 
+        neighbours to its left since the last hit that breaks the chain is odd. Layers without 
+        identical z are skipped, see identical_z.
+
+        Args:
+            ln (int): layer index
+            epsilon (float, optional): shift applied per pass in cm. Defaults to 0.1 micron.
+        """
+        while self.identical_z[ln]:
+            z = self.z[ln]
+            identical = z[1:] == z[:-1]
+            chained = (z[:-1] + epsilon) == z[1:]
+            index = np.arange(len(z) - 1)
+            # the hit after a break is never shifted, after that every identical neighbour flips it
+            last_break = np.maximum.accumulate(np.where(~identical & ~chained, index, -1))
+            flips = np.cumsum(identical)
+            flips = flips - np.where(last_break >= 0, flips[np.maximum(last_break, 0)], 0)
+            shifted = np.concatenate(([False], flips % 2 == 1))
+            self.setLayer(ln, self.layer_num[ln], self.radius[ln], self.phi[ln], np.where(shifted, z + epsilon, z))
             
-    def generateUniform(self, n_points:list):  # MAY BE BROKEN 
+    def generateUniform(self, n_points:list):  
+        # evenly spaced hits on every layer, see readers/generator.py for wedges with tracks
         
-        if len(n_points) != len(self.array): 
+        if len(n_points) != self.env.num_layers: 
             raise Exception("The n_points argument should be of form [*, *, ..., *]. ")
         else: 
-            self.n_points = n_points
+            self.n_points = list(n_points)
         
         limits_per_layer = np.linspace(self.env.beam_axis_lim, 
                                        self.env.top_layer_lim, 
@@ -77,16 +308,16 @@ class DataSet():
         
         
         for ln in range(self.env.num_layers): 
-            layer_arr = list(np.linspace(-limits_per_layer[ln], limits_per_layer[ln], self.n_points[ln]))
-            points = [Point(ln, self.env.radii[ln], 0.0, z) for z in layer_arr]
-            self.array[ln] = points
+            layer_arr = np.linspace(-limits_per_layer[ln], limits_per_layer[ln], self.n_points[ln])
+            self.setLayer(ln, np.full(len(layer_arr), ln+1), np.full(len(layer_arr), self.env.radii[ln]), np.zeros(len(layer_arr)), layer_arr)
             
-    def generateRandom(self, n_points:list):   # MAY BE BROKEN 
+    def generateRandom(self, n_points:list):   
+        # uniformly random hits on every layer, see readers/generator.py for wedges with tracks
         
-        if len(n_points) != len(self.array): 
+        if len(n_points) != self.env.num_layers: 
             raise Exception("The n_points argument should be of form [*, *, ..., *]. ")
         else: 
-            self.n_points = n_points
+            self.n_points = list(n_points)
          
         
         limits_per_layer = np.linspace(self.env.beam_axis_lim, 
@@ -95,9 +326,8 @@ class DataSet():
         
         
         for ln in range(self.env.num_layers): 
-            layer_arr = list(np.sort(np.random.uniform(low=-limits_per_layer[ln], high=limits_per_layer[ln], size=self.n_points[ln])))
-            points = [Point(ln, self.env.radii[ln], 0.0, z) for z in layer_arr]
-            self.array[ln] = points
+            layer_arr = np.sort(np.random.uniform(low=-limits_per_layer[ln], high=limits_per_layer[ln], size=self.n_points[ln]))
+            self.setLayer(ln, np.full(len(layer_arr), ln+1), np.full(len(layer_arr), self.env.radii[ln]), np.zeros(len(layer_arr)), layer_arr)
 
 
     def plot(self, show_lines = False, show = False): 
@@ -110,10 +340,9 @@ class DataSet():
                      linewidth=1)
             
         
-        coords = [(point.z, point.radius) for layer in self.array for point in layer]
         max_height = self.env.radii[-1]
     
-        plt.scatter(*zip(*coords), c="g", s=3)
+        plt.scatter(np.concatenate(self.z), np.concatenate(self.radius), c="g", s=3)
         
         # X Y Labels
         plt.xlabel('z [cm]', fontsize = 20)
@@ -141,17 +370,12 @@ class DataSet():
 
         #print(x_edges)
         for i, value in enumerate(self.env.trapezoid_edges):
-            phi0 = self.array[i][0].phi
-            self.array[i].insert(0,Point(int(i+1), int((i+1)*5), phi0, -1*value-offset))
-            self.array[i].append(Point(int(i+1), int((i+1)*5), phi0, value+offset))
-            self.n_points[i] = int(self.n_points[i]+2)
-
-        self.total_points = len(self.array)
-
-        ln = 0
-        for layer in self.array: 
-            layer.sort(key=lambda point: point.z) 
-            self.n_points[ln] = len(layer)
-            ln += 1
+            phi0 = self.phi[i][0]
+            self.setLayer(i, np.concatenate(([i+1], self.layer_num[i], [i+1])), 
+                          np.concatenate(([int((i+1)*5)], self.radius[i], [int((i+1)*5)])), 
+                          np.concatenate(([phi0], self.phi[i], [phi0])), 
+                          np.concatenate(([-1*value-offset], self.z[i], [value+offset])))
+
+        self.total_points = self.env.num_layers
         self.env.trapezoid_edges = [x + offset for x in self.env.trapezoid_edges]
        
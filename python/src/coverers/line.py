@@ -37,8 +37,26 @@ class LineGenerator():
         max_height = env.radii[-1]
         self.slope_ll = max_height / (-env.top_layer_lim - start)
         self.slope_ul = max_height / (env.top_layer_lim - start)
+
+    def lines(self, slopes, arrays:bool = False): 
+        """Lines from start with the given slopes, what all generate methods return
+
+        Args:
+            slopes (np.ndarray): slopes of the lines
+            arrays (bool, optional): if True, returns the z of all lines on the beam axis and every 
+                layer as one (n, layers+1) array, the points of each Line, and the slopes instead of 
+                a list of Lines. Lines for plotting are Line(env, start, slope). Defaults to False.
+
+        Returns:
+            list: Lines, or tuple of (n, layers+1) z array and (n,) slopes if arrays
+        """
+        if arrays == True: 
+            slopes = np.asarray(slopes, dtype=float)
+            points = (1 / slopes)[:, None] * np.array([0]+self.env.radii)[None, :] + self.start
+            return points, slopes
+        return [Line(self.env, self.start, slope) for slope in slopes]
         
-    def generateGridLines(self, n=100): 
+    def generateGridLines(self, n=100, arrays:bool = False): 
         
         angle_ll = math.atan(self.slope_ul)
         angle_ul = math.atan(self.slope_ll) + np.pi
@@ -46,24 +64,24 @@ class LineGenerator():
         theta = np.linspace(angle_ul, angle_ll, n) 
         
         slopes = np.tan(theta) 
-        return [Line(self.env, self.start, slope) for slope in slopes] 
+        return self.lines(slopes, arrays) 
 
-    def generateEvenGrid(self, n=100):
+    def generateEvenGrid(self, n=100, arrays:bool = False):
 
         Rcoor = self.env.radii[-1]
         Zcoor = np.linspace(-self.env.top_layer_lim, self.env.top_layer_lim, n)
         
         slopes = Rcoor/(Zcoor-self.start)
-        return [Line(self.env, self.start, slope) for slope in slopes] 
+        return self.lines(slopes, arrays) 
     
-    def generateRandomGrid(self, n=100): 
+    def generateRandomGrid(self, n=100, arrays:bool = False): 
         Rcoor = self.env.radii[-1]
         Zcoor = np.random.uniform(low=-self.env.top_layer_lim, high=self.env.top_layer_lim, size=n)
         
         slopes = Rcoor/(Zcoor-self.start)
-        return [Line(self.env, self.start, slope) for slope in slopes] 
+        return self.lines(slopes, arrays) 
     
-    def generateRandomLines(self, n=100): 
+    def generateRandomLines(self, n=100, arrays:bool = False): 
         
         angle_ll = math.atan(self.slope_ul)
         angle_ul = math.atan(self.slope_ll) + np.pi
@@ -73,9 +91,9 @@ class LineGenerator():
         
         slopes = np.tan(theta) 
         
-        return [Line(self.env, self.start, slope) for slope in slopes] 
+        return self.lines(slopes, arrays) 
     
-    def generateCenterSpreadLines(self, n=100): 
+    def generateCenterSpreadLines(self, n=100, arrays:bool = False): 
         
         angle_ll = math.atan(self.slope_ul)
         angle_ul = math.atan(self.slope_ll) + np.pi
@@ -92,9 +110,9 @@ class LineGenerator():
         
         slopes = np.tan(angles)
         
-        return [Line(self.env, self.start, slope) for slope in slopes] 
+        return self.lines(slopes, arrays) 
     
-    def generateCenterGridLines(self, n=100): 
+    def generateCenterGridLines(self, n=100, arrays:bool = False): 
         
         if n%2 == 0: 
             n += 1 
@@ -108,4 +126,4 @@ class LineGenerator():
         
         slopes = np.tan(angles)
         
-        return [Line(self.env, self.start, slope) for slope in slopes]         
\ No newline at end of file
+        return self.lines(slopes, arrays)         
\ No newline at end of file
@@ -1,7 +1,10 @@
-from src.coverers.data_structs import Environment
+from src.coverers.data_structs import Environment, straightLineProjections
 from src.debug import * 
+import numpy as np
 
 class lineSegment(): 
+
+    __slots__ = ('min_z5_accepted', 'max_z5_accepted')
     
     def __init__(self, min_z5_accepted:float, max_z5_accepted:float): 
         
@@ -40,38 +43,154 @@ def intersection(env:Environment, lineSegments:list, forParallelograms:bool):
         return lineSegment(max_of_mins, min_of_maxes)
 
 
-def insideFunction(sorted_lineSegments:list, total_measure:float=0.0): 
-    
-    if len(sorted_lineSegments) != 1: 
+def unionOfLineSegments(lineSegments): 
+    """Measure of the union of line segments, merged in a single sweep from left to right
 
-        first = sorted_lineSegments[0]
-        second = sorted_lineSegments[1]
-        
-        if second.min_z5_accepted > first.max_z5_accepted: 
-            total_measure += first.max_z5_accepted - first.min_z5_accepted 
-        else: 
-            union = lineSegment(first.min_z5_accepted, max(first.max_z5_accepted, second.max_z5_accepted))
-            sorted_lineSegments[1] = union
-            
-        del sorted_lineSegments[0]
-            
-        return insideFunction(sorted_lineSegments, total_measure)
-    
+    Args:
+        lineSegments (list or np.ndarray): lineSegment objects, or an (n, 2) array of their 
+            min and max z5
+
+    Returns:
+        float: total measure
+    """
+    if isinstance(lineSegments, np.ndarray): 
+        bounds = lineSegments.reshape(-1, 2).tolist()
     else: 
-        total_measure += sorted_lineSegments[0].max_z5_accepted - sorted_lineSegments[0].min_z5_accepted 
-        return total_measure 
+        bounds = [(lineSeg.min_z5_accepted, lineSeg.max_z5_accepted) for lineSeg in lineSegments]
+    if len(bounds) == 0: 
+        return 0.0
 
-def unionOfLineSegments(lineSegments:list): 
+    bounds.sort(key=lambda x : x[0])
 
     total_measure = 0.0 
-    
-    lineSegments.sort(key=lambda x : x.min_z5_accepted)
-    total_measure = insideFunction(lineSegments)
+    merged_min, merged_max = bounds[0]
+    for seg_min, seg_max in bounds[1:]: 
+        if seg_min > merged_max: 
+            total_measure += merged_max - merged_min
+            merged_min, merged_max = seg_min, seg_max
+        else: 
+            merged_max = max(merged_max, seg_max)
+    total_measure += merged_max - merged_min
     
     return total_measure 
-            
+
+def unionOfLineSegmentSets(mins, maxes = None): 
+    """Measure of the union of many sets of line segments at once, with a sorted sweep per set
+
+    Every row is one set of segments. The result is the same as unionOfLineSegments on each 
+    row: segments are merged left to right and the merged lengths are added up in that order.
+    Sets with fewer segments can be padded with copies of one of their segments.
+
+    Args:
+        mins (np.ndarray): (n_sets, n_segments) minimum z5 of every segment, or (n_sets, n_segments, 2) 
+            min and max z5 if maxes is not given
+        maxes (np.ndarray, optional): (n_sets, n_segments) maximum z5 of every segment. Defaults to None.
+
+    Returns:
+        tuple: (n_sets,) total measure of each set and (n_sets, 2) min and max of its last merged 
+            segment
+    """
+    if maxes is None: 
+        mins, maxes = mins[..., 0], mins[..., 1]
+    mins = np.ascontiguousarray(mins, dtype=float)
+    maxes = np.ascontiguousarray(maxes, dtype=float)
+    n_sets, n_segments = mins.shape
+    if n_segments == 0: 
+        return np.zeros(n_sets), np.zeros((n_sets, 2))
+
+    # segments of every set sorted by their minimum, one set per column so that the sweep 
+    # runs over contiguous rows
+    order = np.argsort(mins, axis=1, kind='stable').T + np.arange(n_sets) * n_segments
+    mins = mins.ravel()[order]
+    running_max = np.maximum.accumulate(maxes.ravel()[order], axis=0)
+
+    # a merged segment starts wherever a segment begins to the right of everything before it
+    starts = np.ones((n_segments, n_sets), dtype=bool)
+    np.greater(mins[1:], running_max[:-1], out=starts[1:])
+    # mins are sorted, so the start of the current merged segment is the largest start so far
+    merged_mins = np.maximum.accumulate(np.where(starts, mins, -np.inf), axis=0)
+
+    # only the last segment of every merged segment counts, and cumsum adds them up one after 
+    # the other like unionOfLineSegments does, unlike np.sum
+    lengths = running_max - merged_mins
+    lengths[:-1][~starts[1:]] = 0.0
+    total_measure = np.cumsum(lengths, axis=0)[-1]
+    return total_measure, np.stack((merged_mins[-1], running_max[-1]), axis=1)
+
+def patchShadows(env:Environment, superpoint_bounds, z0Array): 
+    """Segment of the top layer accepted by each patch for every z0, the intersection of the 
+    shadows cast from z0 by its superpoints, clipped to the top layer
+
+    Args:
+        env (Environment): environment of the patches
+        superpoint_bounds (np.ndarray): (patches, layers, 2) min and max z of every superpoint
+        z0Array (np.ndarray): z0 values on the beam axis
+
+    Returns:
+        tuple: (len(z0Array), patches) min and max z of the segments, of length 0 if the shadows 
+            of a patch do not overlap
+    """
+    superpoint_bounds = np.asarray(superpoint_bounds, dtype=float).reshape(-1, env.num_layers, 2)
+    # layers first so that the reductions over layers run over contiguous (z0, patches) blocks
+    superpoint_mins = np.ascontiguousarray(superpoint_bounds[:, :, 0].T)[:, None, :]
+    superpoint_maxes = np.ascontiguousarray(superpoint_bounds[:, :, 1].T)[:, None, :]
+    z0 = np.asarray(z0Array, dtype=float)[None, :, None]
+    # straightLineProjectorFromLayerIJtoK(z0, z_j, 0, j, num_layers) for all layers j
+    layers = np.arange(1, env.num_layers + 1)[:, None, None]
+
+    # clipping to the top layer commutes with max and min, so it is done after intersecting the shadows
+    max_of_mins = straightLineProjections(env, z0, superpoint_mins, 0, layers, env.num_layers).max(axis=0)
+    min_of_maxes = straightLineProjections(env, z0, superpoint_maxes, 0, layers, env.num_layers).min(axis=0)
+    max_of_mins = np.minimum(env.top_layer_lim, np.maximum(-env.top_layer_lim, max_of_mins))
+    min_of_maxes = np.maximum(-env.top_layer_lim, np.minimum(env.top_layer_lim, min_of_maxes))
+
+    # intersection of the shadows of each patch, of length 0 if they do not overlap
+    overlaps = np.where(max_of_mins > min_of_maxes, max_of_mins, min_of_maxes)
+    return max_of_mins, overlaps
+
+def acceptanceOfPatches(env:Environment, superpoint_bounds, z0Array): 
+    """Percentage of lines from each z0 accepted by a set of patches, for all z0 in one go
+
+    Gives the same numbers as projecting every superpoint from z0 to the top layer with 
+    straightLineProjectorFromLayerIJtoK, intersecting the shadows of each patch and taking 
+    unionOfLineSegments of the patches, one z0 at a time.
+
+    Args:
+        env (Environment): environment of the patches
+        superpoint_bounds (np.ndarray): (patches, layers, 2) min and max z of every superpoint
+        z0Array (np.ndarray): z0 values on the beam axis
+
+    Returns:
+        tuple: (len(z0Array),) percentage accepted and (len(z0Array), 2) last merged segment of 
+            the union for each z0
+    """
+    total_measure, last_segments = unionOfLineSegmentSets(*patchShadows(env, superpoint_bounds, z0Array))
+    return 100.0*total_measure/(2.0 * env.top_layer_lim), last_segments
+
+def mergeIntervals(*interval_sets): 
+    """Union of sets of intervals as one set of disjoint intervals sorted by z, merged left to 
+    right like unionOfLineSegments
+
+    Args:
+        interval_sets (np.ndarray): (n, 2) min and max of every interval of a set
+
+    Returns:
+        np.ndarray: (m, 2) min and max of the merged intervals
+    """
+    intervals = np.concatenate([np.asarray(intervals, dtype=float).reshape(-1, 2) for intervals in interval_sets] + [np.empty((0, 2))])
+    if len(intervals) == 0: 
+        return intervals
+    intervals = intervals[np.argsort(intervals[:, 0], kind='stable')]
+    running_max = np.maximum.accumulate(intervals[:, 1])
+    starts = np.ones(len(intervals), dtype=bool)
+    np.greater(intervals[1:, 0], running_max[:-1], out=starts[1:])
+    # a merged interval ends where the next one starts
+    ends = np.append(starts[1:], True)
+    return np.stack((intervals[starts, 0], running_max[ends]), axis=1)
 
 class parallelogram_v1(): 
+
+    __slots__ = ('layer_num', 'pSlope', 'shadow_topR_jL', 'shadow_topR_jR', 'shadow_topL_jL', 'shadow_topL_jR', 'top_layer_zmin', 'top_layer_zmax')
     
     def __init__(self, layer_num, top_layer_zmin, top_layer_zmax, shadow_topR_jL, shadow_topR_jR, pSlope): 
         
@@ -128,6 +247,8 @@ def calc_line_intersection(line1_point:tuple, line1_slope, line2_point:tuple, li
     return tuple((z_top, z_0))
 
 class parallelogram(): 
+
+    __slots__ = ('layer_num', 'pSlope', 'shadow_bottomL_jR', 'shadow_bottomR_jR', 'shadow_bottomL_jL', 'shadow_bottomR_jL', 'z1_min', 'z1_max')
     
     def __init__(self, layer_num, z1_min, z1_max, shadow_bottomL_jR, shadow_bottomR_jR, shadow_bottomL_jL, shadow_bottomR_jL, pSlope): 
         
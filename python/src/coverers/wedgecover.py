@@ -5,25 +5,52 @@ import matplotlib.pyplot as plt
 from src.coverers.data_structs import * 
 from src.coverers.line import *
 import math
+import collections
+import contextlib
 import cv2 
 import os 
 import glob
-from time import time 
+from time import time, perf_counter
 from src.coverers.parallelogram import *
-from src.debug import * 
+from src.debug import *
+# numba is optional, linesAcceptedByPatches uses NumPy broadcasting without it
+try: 
+    import numba
+except ImportError: 
+    numba = None 
         
 class wedgeSuperPoint(): 
+
+    # no instance dict, a superpoint is only a hit range of one layer and its extremes
+    __slots__ = ('data', 'layer', 'start', 'stop', 'min', 'max')
     
-    def __init__(self, points):
-        
-        if np.size(points) != 16:
-            if (np.size(points) != 32) and (np.size(points) != 31):
+    def __init__(self, data:DataSet, layer:int, start:int, stop:int, extremes:tuple = None):
+        # superpoint made of the hits start:stop (python slice semantics) of one layer of data
+        # extremes are the min and max z of those hits if the caller already has them, see patchesFromRanges
+        self.data = data
+        self.layer = layer
+        self.start = start
+        self.stop = stop
+        if extremes is not None:
+            self.min, self.max = extremes
+            return
+        z_list = data.z[layer][start:stop]
+        if np.size(z_list) != 16:
+            if (np.size(z_list) != 32) and (np.size(z_list) != 31):
                 raise Exception("This patch does not have 16 or 32/31 points in each layer")
-        z_list = np.array([points[x].z for x in range(len(points))])
-        self.z_values = z_list
-        self.points = points 
-        self.min = np.min(z_list) 
-        self.max = np.max(z_list)
+        # layers are sorted by z, so the extremes are the end hits
+        self.min = float(z_list[0])
+        self.max = float(z_list[-1])
+
+    @property
+    def z_values(self): 
+        # z of the hits of the superpoint, a view into the layer of data
+        return self.data.z[self.layer][self.start:self.stop]
+
+    @property
+    def points(self): 
+        # Point objects of the superpoint, only built when asked for
+        return self.data.points(self.layer, self.start, self.stop)
         
     def contains(self, p): 
         try:
@@ -35,17 +62,82 @@ class wedgeSuperPoint():
     def __eq__(self, other): 
         return (self.min, self.max) == (other.min, other.max)
 
+# number of wedgePatches created and of evaluations of their geometry methods, see geometryCounts
+geometry_counter = collections.Counter()
+
+def geometryCounts(reset:bool = False): 
+    """Reports how much patch geometry was computed and how much was skipped by computing it lazily
+
+    Args:
+        reset (bool, optional): True to start counting from zero again. Defaults to False.
+
+    Returns:
+        dict: number of patches created, and per geometry method the number of evaluations and 
+            the number of patches it was never evaluated for. getShadows also counts the calls 
+            answered from the shadows of the previous call.
+    """
+    patches = geometry_counter['patches']
+    counts = {'patches': patches}
+    for method in ['getParallelograms', 'getParallelograms_v1', 'get_acceptanceCorners', 'get_end_layer']: 
+        counts[method] = {'evaluated': geometry_counter[method], 'avoided': patches - geometry_counter[method]}
+    counts['getShadows'] = {'evaluated': geometry_counter['getShadows'], 'reused': geometry_counter['getShadows_reused']}
+    if reset == True: 
+        geometry_counter.clear()
+    return counts
+
+class patchGeometry(): 
+    # attribute of a wedgePatch that is derived from its superpoints: it is computed by the given 
+    # method of the patch the first time it is read and kept in the slot of the same name with a 
+    # leading underscore
+
+    def __init__(self, method:str): 
+        self.method = method
+
+    def __set_name__(self, owner, name): 
+        self.slot = '_' + name
+
+    def __get__(self, patch, owner = None): 
+        if patch is None: 
+            return self
+        if getattr(patch, self.slot) is None: 
+            geometry_counter[self.method] += 1
+            getattr(patch, self.method)()
+        return getattr(patch, self.slot)
+
+    def __set__(self, patch, value): 
+        setattr(patch, self.slot, value)
+
 class wedgePatch(): 
     
     # Should be hashable (nvm we can't make it hashable) 
+
+    # derived geometry, only computed when used
+    parallelograms = patchGeometry('getParallelograms')
+    parallelograms_v1 = patchGeometry('getParallelograms_v1')
+    a_corner = patchGeometry('get_acceptanceCorners')
+    b_corner = patchGeometry('get_acceptanceCorners')
+    c_corner = patchGeometry('get_acceptanceCorners')
+    d_corner = patchGeometry('get_acceptanceCorners')
+    squareAcceptance = patchGeometry('get_acceptanceCorners')
+    flatTop = patchGeometry('get_acceptanceCorners')
+    flatBottom = patchGeometry('get_acceptanceCorners')
+    triangleAcceptance = patchGeometry('get_acceptanceCorners')
+    left_end_layer = patchGeometry('get_end_layer')
+    right_end_layer = patchGeometry('get_end_layer')
+    left_end_lambdaZ = patchGeometry('get_end_layer')
+    right_end_lambdaZ = patchGeometry('get_end_layer')
+
+    __slots__ = ('env', 'superpoints', 'apexZ0', 'end_layer', 
+                 'shadow_fromTopToInnermost_topL_jL', 'shadow_fromTopToInnermost_topL_jR', 
+                 'shadow_fromTopToInnermost_topR_jL', 'shadow_fromTopToInnermost_topR_jR', '_shadows_zTop', 
+                 '_parallelograms', '_parallelograms_v1', 
+                 '_a_corner', '_b_corner', '_c_corner', '_d_corner', 
+                 '_squareAcceptance', '_flatTop', '_flatBottom', '_triangleAcceptance', 
+                 '_left_end_layer', '_right_end_layer', '_left_end_lambdaZ', '_right_end_lambdaZ')
     
     def __init__(self, env:Environment, superpoints:tuple, apexZ0): 
         self.env = env 
         self.end_layer = -1
-        self.left_end_layer = -1
-        self.right_end_layer = -1
-        self.left_end_lambdaZ = None
-        self.right_end_lambdaZ = None
         self.apexZ0 = apexZ0
 
         self.shadow_fromTopToInnermost_topL_jL = None
@@ -58,11 +150,13 @@ class wedgePatch():
         
         self.superpoints = superpoints
         # first superpoint in array should be the 1st layer 
-        
-        self.getParallelograms()
-        self.getParallelograms_v1()
-        self.get_acceptanceCorners()
-        self.get_end_layer()
+
+        # parallelograms, acceptance corners and end layers are computed on first use, 
+        # _shadows_zTop is the zTopMin and zTopMax of the last getShadows
+        for slot in self.__slots__: 
+            if slot.startswith('_'): 
+                setattr(self, slot, None)
+        geometry_counter['patches'] += 1
         
     def contains(self, line:Line): 
         
@@ -101,25 +195,9 @@ class wedgePatch():
         return z_j - (z_j - z_1) * radii_leverArm
     
     def straightLineProjectorFromLayerIJtoK(self, z_i, z_j, i, j, k):
-        # i,j,k = 0 implies beam axis
-        radius_i = 0
-        radius_j = 0
-        radius_k = 0
-        if (i == 0):
-            radius_i = 0
-        else:
-            radius_i = self.env.radii[i-1]
-        if (j == 0):
-            radius_j = 0
-        else:
-            radius_j = self.env.radii[j-1]            
-        if (k == 0):
-            radius_k = 0
-        else:
-            radius_k = self.env.radii[k-1]            
-        radii_leverArm = (radius_k - radius_i) / (radius_j - radius_i)
+        # i,j,k = 0 implies beam axis, the lever arms of all (i, j, k) are computed once by the Environment
         #return z_k projected by z_j and z_i
-        return z_i + (z_j - z_i) * radii_leverArm
+        return z_i + (z_j - z_i) * self.env.leverArmTable[i][j][k]
     
     def getParallelograms(self): 
 
@@ -152,6 +230,13 @@ class wedgePatch():
 
     def getShadows(self, zTopMin, zTopMax):
         
+        # the shadows only change with zTopMin and zTopMax, the loops ask again for the same ones
+        if self._shadows_zTop == (zTopMin, zTopMax):
+            geometry_counter['getShadows_reused'] += 1
+            return
+        geometry_counter['getShadows'] += 1
+        self._shadows_zTop = (zTopMin, zTopMax)
+
         # AVK add shadows from topLayer coordinate to innermost layer
         zTop_min = max(zTopMin, -self.env.trapezoid_edges[self.env.num_layers-1])
         zTop_max = min(zTopMax, self.env.trapezoid_edges[self.env.num_layers-1])
@@ -438,17 +523,261 @@ class wedgePatch():
     def get_end_layer(self):
         lambdaZ_left_list = []
         lambdaZ_right_list = []
-        for layer in range(self.env.num_layers):
-            lambdaZ_left_list.append((self.superpoints[layer].min-self.apexZ0)/self.env.radii[layer])
-            lambdaZ_right_list.append((self.superpoints[layer].max-self.apexZ0)/self.env.radii[layer])
+        data = self.superpoints[0].data
+        if data.hasLambdaZ(self.apexZ0):
+            #the lambdaZ of the extremes are already in the index when the loop projected from this apexZ0
+            for layer in range(self.env.num_layers):
+                lambdaZ_values = data.lambdaZ(layer, self.apexZ0)[self.superpoints[layer].start:self.superpoints[layer].stop]
+                lambdaZ_left_list.append(lambdaZ_values[0])
+                lambdaZ_right_list.append(lambdaZ_values[-1])
+        else:
+            for layer in range(self.env.num_layers):
+                lambdaZ_left_list.append((self.superpoints[layer].min-self.apexZ0)/self.env.radii[layer])
+                lambdaZ_right_list.append((self.superpoints[layer].max-self.apexZ0)/self.env.radii[layer])
         self.left_end_layer = np.argmax(lambdaZ_left_list)
         self.right_end_layer = np.argmin(lambdaZ_right_list)
         self.left_end_lambdaZ = max(lambdaZ_left_list)
         self.right_end_lambdaZ = min(lambdaZ_right_list)
 
+def acceptanceCorners(env:Environment, bounds): 
+    """Acceptance corners of many patches at once, the same as get_acceptanceCorners on each patch
+
+    The parallelogram shadows a, b, c, d of every layer are projected for all patches together 
+    and reduced over the layers, then the triangle fixes are applied with masks.
+
+    Args:
+        env (Environment): environment of the patches
+        bounds (np.ndarray): (n_patches, layers, 2) min and max z of the superpoints of each patch
+
+    Returns:
+        dict: a_corner, b_corner, c_corner and d_corner as (n_patches, 2) arrays, and squareAcceptance,
+            flatTop, flatBottom and triangleAcceptance as (n_patches,) boolean arrays
+    """
+    bounds = np.asarray(bounds, dtype=float).reshape(-1, env.num_layers, 2)
+    z1_min = np.maximum(bounds[:, 0, 0], -env.trapezoid_edges[0])
+    z1_max = np.minimum(bounds[:, 0, 1], env.trapezoid_edges[0])
+    empty = z1_min > z1_max
+    z1_min = np.where(empty, env.trapezoid_edges[0] + 1, z1_min)
+    z1_max = np.where(empty, z1_min, z1_max)
+
+    # shadows on the outermost layer of the lines through layer 1 and layer j, as in getParallelograms
+    layers = np.arange(2, env.num_layers + 1)
+    z1_min, z1_max = z1_min[:, None], z1_max[:, None]
+    a = straightLineProjections(env, z1_min, bounds[:, 1:, 1], 1, layers, env.num_layers)
+    b = straightLineProjections(env, z1_max, bounds[:, 1:, 1], 1, layers, env.num_layers)
+    c = straightLineProjections(env, z1_min, bounds[:, 1:, 0], 1, layers, env.num_layers)
+    d = straightLineProjections(env, z1_max, bounds[:, 1:, 0], 1, layers, env.num_layers)
+    z1_min, z1_max = z1_min[:, 0], z1_max[:, 0]
+
+    a_top, b_top = a.min(axis=1), b.min(axis=1)
+    c_bottom, d_bottom = c.max(axis=1), d.max(axis=1)
+    # is layer5 the most restrictive acceptance? 
+    flatTop = (a_top == a[:, -1]) & (b_top == b[:, -1])
+    flatBottom = (c_bottom == c[:, -1]) & (d_bottom == d[:, -1])
+
+    # is the acceptance a triangle shape?
+    top_triangle = c_bottom > a_top
+    c_bottom = np.where(top_triangle, b_top, c_bottom)
+    a_top = np.where(top_triangle, b_top, a_top)
+    bottom_triangle = b_top < d_bottom
+    b_top = np.where(bottom_triangle, c_bottom, b_top)
+    d_bottom = np.where(bottom_triangle, c_bottom, d_bottom)
+
+    return {'a_corner': np.stack((z1_min, a_top), axis=1), 'b_corner': np.stack((z1_max, b_top), axis=1),
+            'c_corner': np.stack((z1_min, c_bottom), axis=1), 'd_corner': np.stack((z1_max, d_bottom), axis=1),
+            'squareAcceptance': flatTop & flatBottom, 'flatTop': flatTop, 'flatBottom': flatBottom, 
+            'triangleAcceptance': top_triangle | bottom_triangle}
+
+# lines per block of linesAcceptedByPatches, keeps the (lines, patches) masks of the NumPy path small
+ACCEPTANCE_BLOCK_SIZE = 2**20
+
+if numba is not None: 
+    @numba.njit(cache=True)
+    def _linesAcceptedByPatches_numba(lines, bounds): 
+        # same as the NumPy path of linesAcceptedByPatches, stopping at the first patch and layer that decide
+        first_patch = np.full(lines.shape[0], -1, dtype=np.int64)
+        for i in range(lines.shape[0]): 
+            for p in range(bounds.shape[0]): 
+                inside = True
+                for layer in range(bounds.shape[1]): 
+                    if not (bounds[p, layer, 0] <= lines[i, layer] <= bounds[p, layer, 1]): 
+                        inside = False
+                        break
+                if inside: 
+                    first_patch[i] = p
+                    break
+        return first_patch
+
+def linesAcceptedByPatches(lines, superpoint_bounds, use_numba:bool = True): 
+    """Tests many lines against many patches at once, the same as wedgePatch.contains for every pair
+
+    A line is accepted by a patch if its z on every layer is inside the superpoint of that layer.
+
+    Args:
+        lines (np.ndarray): (n_lines, layers) z of each line on each layer, line.points[1:] of a Line
+        superpoint_bounds (np.ndarray): (n_patches, layers, 2) min and max z of every superpoint, 
+            see wedgeCover.superpoint_bounds
+        use_numba (bool, optional): compile the loops with numba when it is installed. Defaults to True.
+
+    Returns:
+        tuple: (n_lines,) True for the lines accepted by at least one patch and (n_lines,) index of 
+            the first patch accepting each line, -1 if none does
+    """
+    lines = np.ascontiguousarray(lines, dtype=float)
+    lines = lines.reshape(len(lines), -1)
+    bounds = np.ascontiguousarray(superpoint_bounds, dtype=float).reshape(-1, lines.shape[1], 2)
+    if use_numba and (numba is not None): 
+        first_patch = _linesAcceptedByPatches_numba(lines, bounds)
+        return first_patch >= 0, first_patch
+
+    first_patch = np.full(len(lines), -1, dtype=np.int64)
+    if len(bounds) == 0: 
+        return first_patch >= 0, first_patch
+    block = max(1, ACCEPTANCE_BLOCK_SIZE // len(bounds))
+    for start in range(0, len(lines), block): 
+        block_lines = lines[start:start+block]
+        inside = np.ones((len(block_lines), len(bounds)), dtype=bool)
+        for layer in range(lines.shape[1]): 
+            z = block_lines[:, layer, None]
+            inside &= (bounds[None, :, layer, 0] <= z) & (z <= bounds[None, :, layer, 1])
+        accepted = inside.any(axis=1)
+        first_patch[start:start+block] = np.where(accepted, inside.argmax(axis=1), -1)
+    return first_patch >= 0, first_patch
+
+def pointRepetitionFactors(data:DataSet, superpoint_bounds, x_edges = None, x_edge_margin:float = 0.): 
+    """Number of patches containing each hit, the same as counting wedgePatch.contains_p over all patches
+
+    Every superpoint covers the hits from the first one at or above its min to the last one at or 
+    below its max, found with binary searches in the sorted layer. The ends are counted as +1 and -1 
+    events and their cumulative sum is the coverage of every hit, in O((N + P) log N) per layer.
+
+    Args:
+        data (DataSet): hits of the wedge
+        superpoint_bounds (np.ndarray): (n_patches, layers, 2) min and max z of every superpoint, 
+            see wedgeCover.superpoint_bounds
+        x_edges (np.ndarray, optional): if given, only the hits with |z| <= x_edges[layer] + x_edge_margin
+            that are in at least one patch are kept. Defaults to None.
+        x_edge_margin (float, optional): margin added to x_edges. Defaults to 0.
+
+    Returns:
+        list: for each layer an array of the number of patches containing its hits, in the order of data.z
+    """
+    bounds = np.asarray(superpoint_bounds, dtype=float).reshape(-1, data.env.num_layers, 2)
+    prf = []
+    for layer in range(data.env.num_layers): 
+        z = data.z[layer]
+        starts = np.searchsorted(z, bounds[:, layer, 0], side='left')
+        stops = np.maximum(np.searchsorted(z, bounds[:, layer, 1], side='right'), starts)
+        events = np.bincount(starts, minlength=len(z)+1) - np.bincount(stops, minlength=len(z)+1)
+        counts = np.cumsum(events[:len(z)])
+        if x_edges is not None: 
+            counts = counts[(np.abs(z) <= x_edges[layer] + x_edge_margin) & (counts != 0)]
+        prf.append(counts)
+    return prf
+
+def patchesFromRanges(env:Environment, data:DataSet, ranges, apexZ0): 
+    """Builds many wedgePatches at once from the hit ranges of their superpoints
+
+    The superpoint extremes come from one gather per layer and the acceptance corners and end 
+    layers of all patches are computed together with NumPy and stored in the patches, so reading 
+    them later costs nothing. Parallelograms are still derived on first use.
+
+    Args:
+        env (Environment): environment of the patches
+        data (DataSet): hits the ranges point into
+        ranges (np.ndarray): (n_patches, layers, 2) start and stop hit index of every superpoint, 
+            non-negative like the ranges stored by CoverCache
+        apexZ0 (num or list): apexZ0 of all patches, or one per patch
+
+    Returns:
+        list: the wedgePatches
+    """
+    ranges = np.asarray(ranges, dtype=np.int64).reshape(-1, env.num_layers, 2)
+    n_patches = len(ranges)
+    apexZ0s = list(apexZ0) if np.ndim(apexZ0) > 0 else [apexZ0]*n_patches
+    if len(apexZ0s) != n_patches: 
+        raise Exception("There should be one apexZ0 per patch.")
+    if n_patches == 0: 
+        return []
+    if np.any(~np.isin(ranges[:, :, 1] - ranges[:, :, 0], [16, 31, 32])): 
+        raise Exception("This patch does not have 16 or 32/31 points in each layer")
+
+    # layers are sorted by z, so the extremes are the end hits
+    bounds = np.stack([np.stack((data.z[layer][ranges[:, layer, 0]], data.z[layer][ranges[:, layer, 1] - 1]), axis=1) 
+                       for layer in range(env.num_layers)], axis=1)
+    corners = acceptanceCorners(env, bounds)
+    lambdaZ = (bounds - np.array(apexZ0s, dtype=float)[:, None, None])/np.array(env.radii)[None, :, None]
+    left_end_layer = np.argmax(lambdaZ[:, :, 0], axis=1)
+    right_end_layer = np.argmin(lambdaZ[:, :, 1], axis=1)
+    left_end_lambdaZ = lambdaZ[:, :, 0].max(axis=1).tolist()
+    right_end_lambdaZ = lambdaZ[:, :, 1].min(axis=1).tolist()
+
+    patches = []
+    for i, (patch_ranges, patch_bounds) in enumerate(zip(ranges.tolist(), bounds.tolist())): 
+        patch = wedgePatch(env, tuple(wedgeSuperPoint(data, layer, start, stop, extremes) for layer, ((start, stop), extremes) 
+                                      in enumerate(zip(patch_ranges, patch_bounds))), apexZ0=apexZ0s[i])
+        for name in ['a_corner', 'b_corner', 'c_corner', 'd_corner']: 
+            setattr(patch, '_' + name, tuple(corners[name][i].tolist()))
+        for name in ['squareAcceptance', 'flatTop', 'flatBottom', 'triangleAcceptance']: 
+            setattr(patch, '_' + name, bool(corners[name][i]))
+        patch._left_end_layer = left_end_layer[i]
+        patch._right_end_layer = right_end_layer[i]
+        patch._left_end_lambdaZ = left_end_lambdaZ[i]
+        patch._right_end_lambdaZ = right_end_lambdaZ[i]
+        patches.append(patch)
+    return patches
+
+class coverStats(): 
+    """Counters and wall time per stage of covering wedges, collected only if a wedgeCover is given one
+
+    counts holds the calls of makePatch_alignedToLine and evaluate_patch, the patches added, deleted 
+    and discarded, the steps of the white space and horizontal shift loops, the hit lookups and the 
+    geometry evaluations of the patches. seconds holds the wall time of each stage. The stats of 
+    several wedges add up with + to the stats of a run.
+    """
+
+    def __init__(self): 
+        self.counts = collections.Counter()
+        self.seconds = collections.Counter()
+        self.wedges = 0
+
+    @contextlib.contextmanager
+    def stage(self, name:str): 
+        # adds the wall time of the with block to the stage name
+        start = perf_counter()
+        try: 
+            yield
+        finally: 
+            self.seconds[name] += perf_counter() - start
+
+    def __add__(self, other): 
+        total = coverStats()
+        total += self
+        total += other
+        return total
+
+    def __iadd__(self, other): 
+        self.counts.update(other.counts)
+        self.seconds.update(other.seconds)
+        self.wedges += other.wedges
+        return self
+
+    def as_dict(self): 
+        # plain dict of the stats, for saving them as JSON
+        return {'wedges': self.wedges, 'counts': dict(self.counts), 'seconds': dict(self.seconds)}
+
+    def report(self): 
+        # prints the totals and the mean per wedge of every stage and counter
+        wedges = max(self.wedges, 1)
+        print(f"stats of {self.wedges} wedges, total and per wedge")
+        for name, seconds in sorted(self.seconds.items(), key = lambda item: -item[1]): 
+            print(f"    {name:<40} {seconds:12.4f}s {seconds/wedges:12.6f}s")
+        for name, count in sorted(self.counts.items()): 
+            print(f"    {name:<40} {count:12d} {count/wedges:12.1f}")
+
 class wedgeCover(): 
     
-    def __init__(self, env:Environment, data:DataSet): 
+    def __init__(self, env:Environment, data:DataSet, stats:coverStats = None): 
         self.n_patches = 0 
         self.patches = [] 
         self.env = env 
@@ -457,46 +786,81 @@ class wedgeCover():
         self.superPoints = [] 
         self.all_patches = []
         self.real_patch_list = []
+        # candidate patches that were evaluated and dropped for a better one without being added
+        self.n_discarded_patches = 0
+        # steps taken and complementary patches made by the white space search, per column of ShadowQuilt_fromEdges
+        self.white_space_steps = []
+        # coverStats the solve is counted and timed in, nothing is collected if None
+        self.stats = stats
         
-    def add_patch(self, curr_patch:wedgePatch): 
+    def is_new_patch(self, curr_patch:wedgePatch): 
+        # True if add_patch would add the patch, that is if the cover is empty or the superpoints 
+        # of the patch differ from those of the last patch
         if self.n_patches == 0: 
+            return True
+        prev_sp = self.patches[-1].superpoints 
+        curr_sp = curr_patch.superpoints 
+        for l in range(len(prev_sp)): 
+            if (prev_sp[l].min != curr_sp[l].min) or (prev_sp[l].max != curr_sp[l].max): 
+                return True
+        return False
+
+    def add_patch(self, curr_patch:wedgePatch): 
+        if self.is_new_patch(curr_patch): 
             self.patches.append(curr_patch) 
             self.all_patches.append(curr_patch)
             self.real_patch_list.append(True)
             self.n_patches += 1 
-        else:
-            prev_patch = self.patches[-1] 
-            prev_sp = prev_patch.superpoints 
-            curr_sp = curr_patch.superpoints 
-            
-            for l in range(len(prev_sp)): 
-                if (prev_sp[l].min != curr_sp[l].min) or (prev_sp[l].max != curr_sp[l].max): 
-                    self.patches.append(curr_patch) 
-                    self.all_patches.append(curr_patch)
-                    self.real_patch_list.append(True)
-                    self.n_patches += 1 
-                    break
+            if self.stats is not None: 
+                self.stats.counts['added_patches'] += 1
     
+    def commit_patch(self, candidate:wedgePatch): 
+        """Adds a candidate patch from evaluate_patch to the cover
+
+        Args:
+            candidate (wedgePatch): patch to add
+
+        Returns:
+            bool: False if it was not added because it has the same superpoints as the last patch
+        """
+        n_patches = self.n_patches
+        self.add_patch(candidate)
+        return self.n_patches > n_patches
+
     def delete_patch(self, index):
         
+        if self.stats is not None: 
+            self.stats.counts['delete_patch'] += 1
         del self.patches[index]
         self.real_patch_list[index] = False
 
-    def solve(self, lining:str = "makePatches_Projective", apexZ0=0, ppl = 16, nlines:int=100, leftRight:bool =True, show = True):
+    def superpoint_bounds(self): 
+        # (patches, layers, 2) array of the min and max z of every superpoint of the cover
+        return np.array([[[sp.min, sp.max] for sp in patch.superpoints] for patch in self.patches], dtype=float).reshape(-1, self.env.num_layers, 2)
 
-        # AVK remove identicalness of z-values of adjacent hits
+    def solve(self, lining:str = "makePatches_Projective", apexZ0=0, ppl = 16, nlines:int=100, leftRight:bool =True, show = True):
+        # makes the patches of the cover with solve_lining, timing it and collecting its counters if the cover has stats
+        if self.stats is None: 
+            return self.solve_lining(lining = lining, apexZ0 = apexZ0, ppl = ppl, nlines = nlines, leftRight = leftRight, show = show)
+
+        geometry_before = geometry_counter.copy()
+        with self.stats.stage('solve'): 
+            self.solve_lining(lining = lining, apexZ0 = apexZ0, ppl = ppl, nlines = nlines, leftRight = leftRight, show = show)
+        counts = self.stats.counts
+        for method, evaluated in (geometry_counter - geometry_before).items(): 
+            counts['geometry/' + method] += evaluated
+        counts['patches'] += self.n_patches
+        counts['all_patches'] += len(self.all_patches)
+        counts['discarded_patches'] += self.n_discarded_patches
+        counts['white_space_steps'] += sum(column['steps'] for column in self.white_space_steps)
+        counts['white_space_evaluations'] += sum(column['evaluations'] for column in self.white_space_steps)
+        self.stats.wedges += 1
+
+    def solve_lining(self, lining:str = "makePatches_Projective", apexZ0=0, ppl = 16, nlines:int=100, leftRight:bool =True, show = True):
+
+        # AVK remove identicalness of z-values of adjacent hits, nothing to do for data imported with importData
         for row in range(self.env.num_layers):
-            foundIdentical = False
-            firstTime = True
-            while (foundIdentical or firstTime):
-                foundIdentical = False
-                for x in range(len(self.data.array[row])-1):
-                    if (self.data.array[row][x].z == self.data.array[row][x+1].z):
-                        self.data.array[row][x+1].z += 0.00001
-                        foundIdentical = True # search again to make sure there are no other identical ones 
-                firstTime = False
-                if foundIdentical:
-                    self.data.array[row].sort(key=lambda point: point.z)
+            self.data.removeIdenticalZ(row)
 
         if show == True:
             fitting_lines = []
@@ -566,22 +930,9 @@ class wedgeCover():
             raise("Please choose valid solving method")
 
     def get_index_from_z(self, layer, z_value, alignment = 'closest'):
-        layer_data = np.array([self.data.array[layer][x].z for x in range(len(self.data.array[layer]))])
-        index = np.argmin(np.abs((layer_data - z_value)))
-        if alignment == 'closest':
-            return index
-        
-        if alignment == 'above':
-            if layer_data[index] > z_value:
-                return index
-            else:
-                return index + 1
-            
-        if alignment == 'below':
-            if layer_data[index] < z_value:
-                return index
-            else:
-                return index - 1
+        if self.stats is not None: 
+            self.stats.counts['hit_lookups'] += 1
+        return self.data.indexFromZ(layer, z_value, alignment)
 
     def makePatches_ShadowQuilt_fromEdges_v0(self, apexZ0 = 0, stop = 1, ppl = 16, leftRight = True):
         """This method uses the geometry of shadows to generate patches based on superpoints
@@ -1091,6 +1442,122 @@ class wedgeCover():
             #print(total_num_rows)
          
 #        print(z_top_min,z_top_max)
+    def whiteSpaceLoopContinues(self, white_space_height, previous_white_space_height, complementary:wedgePatch, current_z_top_index):
+        # condition of the white space loop of makePatches_ShadowQuilt_fromEdges, apart from the repeated patch checks
+        return not((white_space_height <= 0) and (previous_white_space_height >= 0)) and (abs(white_space_height)>0.000001) and ((complementary.c_corner[1] > -self.env.trapezoid_edges[self.env.num_layers-1]) or (white_space_height > 0)) and (current_z_top_index < (len(self.data.z[self.env.num_layers-1])-1))
+
+    def whiteSpaceStep(self, complementary:wedgePatch, apexZ0, z_top_min, previous_z_top_min, white_space_height):
+        """Moves z_top of the complementary patch of makePatches_ShadowQuilt_fromEdges one hit up if white_space_height >= 0 
+        and one hit down if it is < 0, to the neighbouring hit of the layer whose projection to the top layer moves it least. 
+        Only the sign of white_space_height is used, so the steps can be taken without making the patches.
+
+        Args:
+            complementary (wedgePatch): current complementary patch
+            apexZ0 (num): z on layer 1 of the complementary patch
+            z_top_min (num): current z_top of the complementary patch
+            previous_z_top_min (num): z_top of the step before, -999 for the first step
+            white_space_height (num): white space between the original and the current complementary patch
+
+        Returns:
+            tuple: new z_top_min, top layer index of the step, new_z_i_index, new_z_i_atTop and layerWithSmallestShift
+        """
+        top = self.env.num_layers-1
+        current_z_top_index = self.get_index_from_z(top, z_top_min)
+        current_z_i_index = tuple(self.get_index_from_z(
+            layer,
+            complementary.straightLineProjectorFromLayerIJtoK(apexZ0,z_top_min,1,self.env.num_layers,layer+1)
+            ) for layer in range(self.env.num_layers))
+        if (z_top_min == previous_z_top_min):
+            current_z_top_index += 1
+        if (white_space_height < 0):
+            current_z_top_index -= 1
+            new_z_i_index = tuple(oldIndex-1 for oldIndex in current_z_i_index)
+        else:
+            current_z_top_index += 1
+            new_z_i_index = tuple(oldIndex+1 for oldIndex in current_z_i_index)
+        current_z_top_index = min(current_z_top_index,len(self.data.z[top])-1)
+        new_z_i_index = tuple(min(z_i_index,len(self.data.z[layer])-1) for layer, z_i_index in enumerate(new_z_i_index)) 
+        new_z_i_index = tuple(max(z_i_index,0) for layer, z_i_index in enumerate(new_z_i_index))
+        new_z_i = tuple(self.data.z[layer][new_z_i_index[layer]] for layer in range(self.env.num_layers))
+        new_z_i_atTop = tuple(complementary.straightLineProjectorFromLayerIJtoK(apexZ0,new_z_i[layer],1,layer+1,self.env.num_layers) for layer in range(1,self.env.num_layers))
+        layerWithSmallestShift = 1 + np.argmin(np.abs(np.array(new_z_i_atTop)-z_top_min))
+        new_z_top_min = self.data.z[top][current_z_top_index]
+        new_z_top_min = new_z_i_atTop[layerWithSmallestShift-1] # AVK try smallest shift
+        if abs(new_z_top_min-z_top_min) < 0.000001:
+            new_z_top_min = self.data.z[top][current_z_top_index]
+        if abs(new_z_top_min-z_top_min) < 0.000001:
+            new_z_top_min = self.data.z[top-1][current_z_top_index]
+        if abs(new_z_top_min-z_top_min) < 0.000001:
+            new_z_top_min = self.data.z[top-2][current_z_top_index]
+        if ((new_z_top_min-z_top_min)*(white_space_height)) < 0:
+            new_z_top_min = new_z_i_atTop[self.env.num_layers-2]
+        return new_z_top_min, current_z_top_index, new_z_i_index, new_z_i_atTop, layerWithSmallestShift
+
+    def skipWhiteSpaceSteps(self, original_c, original_d, apexZ0, ppl, complementary:wedgePatch, z_top_min, white_space_height):
+        """Skips the steps of the white space loop of makePatches_ShadowQuilt_fromEdges that go in the direction of 
+        its first step. The white space only changes sign once along them, so the first step where the loop stops 
+        or turns around is found by galloping and then bisecting over the steps, making O(log N) complementary 
+        patches instead of one per step. The loop continues from there exactly as if it had taken the steps.
+
+        Args:
+            original_c (num): z on the top layer of the c corner of the original patch
+            original_d (num): z on the top layer of the d corner of the original patch
+            apexZ0 (num): z on layer 1 of the complementary patch
+            ppl (int): points per patch per layer
+            complementary (wedgePatch): first complementary patch, made for z_top_min
+            z_top_min (num): z_top of the first complementary patch
+            white_space_height (num): white space between the original and the first complementary patch
+
+        Returns:
+            tuple: complementary patch, z_top_min, previous_z_top_min, current_z_top_index, white_space_height and 
+                previous_white_space_height to continue the loop with, number of steps skipped and number of patches made
+        """
+        first_white_space_height = white_space_height
+        if not self.whiteSpaceLoopContinues(white_space_height, -1, complementary, -1):
+            return complementary, z_top_min, -999, -1, white_space_height, -1, 0, 0
+        # z_top_min, previous_z_top_min and current_z_top_index after each step, as long as the sign does not change
+        steps = [(z_top_min, -999, -1)]
+        made = {0: (complementary, white_space_height)}
+        max_steps = len(self.data.z[self.env.num_layers-1])
+
+        def continues(step): 
+            # True if the loop takes the step after this one in the same direction
+            while len(steps) <= step: 
+                current_z_top_min, previous_z_top_min, current_z_top_index = steps[-1]
+                if current_z_top_index >= len(self.data.z[self.env.num_layers-1])-1: 
+                    return False
+                new_z_top_min, current_z_top_index = self.whiteSpaceStep(complementary, apexZ0, current_z_top_min, previous_z_top_min, first_white_space_height)[:2]
+                steps.append((new_z_top_min, current_z_top_min, current_z_top_index))
+            if step not in made: 
+                candidate = self.evaluate_patch(apexZ0 = apexZ0, ppl = ppl, z_top = steps[step][0], leftRight=True)
+                made[step] = (candidate, max(original_c - candidate.a_corner[1], original_d - candidate.b_corner[1]))
+            candidate, candidate_white_space_height = made[step]
+            # the white space of the step before has the sign of the first one
+            return ((candidate_white_space_height < 0) == (first_white_space_height < 0)) and self.whiteSpaceLoopContinues(
+                candidate_white_space_height, first_white_space_height, candidate, steps[step][2])
+
+        low = 0
+        high = 1
+        while (high < max_steps) and continues(high): 
+            low = high
+            high = min(2*high, max_steps)
+        if (high == max_steps) and continues(high): 
+            low = high
+        while high - low > 1: 
+            middle = (low + high) // 2
+            if continues(middle): 
+                low = middle
+            else: 
+                high = middle
+        # first step where the loop stops or turns around, or the last one if it never does
+        stop = high
+        continues(stop)
+        complementary, white_space_height = made[stop]
+        self.n_discarded_patches += len(made) - 1
+        z_top_min, previous_z_top_min, current_z_top_index = steps[stop]
+        previous_white_space_height = -1 if stop == 0 else first_white_space_height
+        return complementary, z_top_min, previous_z_top_min, current_z_top_index, white_space_height, previous_white_space_height, stop, len(made) - 1
+
     def makePatches_ShadowQuilt_fromEdges(self, apexZ0 = 0, stop = 1, ppl = 16, leftRight = True):
         """This method uses the geometry of shadows to generate patches based on superpoints
             the outer layer and the z0 of the collision point. 
@@ -1117,6 +1584,7 @@ class wedgeCover():
                             self.patches[-1].straightLineProjectorFromLayerIJtoK(-self.env.beam_axis_lim,apexZ0,0,1,self.env.num_layers))
             nPatchesInColumn = 0
             projectionOfCcornerToBeam = 0
+            self.white_space_steps.append({'steps': 0, 'evaluations': 0})
             while (c_corner > -self.env.trapezoid_edges[self.env.num_layers-1]) and (nPatchesInColumn<100000000) and (projectionOfCcornerToBeam < self.env.beam_axis_lim):
                 nPatchesInColumn += 1
                 self.makePatch_alignedToLine(apexZ0 = apexZ0, ppl = ppl, z_top = z_top_max, leftRight=False)
@@ -1144,7 +1612,7 @@ class wedgeCover():
                 squarePatch_alternate2 = ((self.patches[-1].a_corner[1] > z_top_max) and self.patches[-1].flatBottom)
                 notChoppedPatch = (self.patches[-1].squareAcceptance) or squarePatch_alternate1 or squarePatch_alternate2
                 madeComplementaryPatch = False
-                nPatchesAtOriginal = len(self.patches)
+                original = self.patches[-1]
                 print('squareAcceptance: ', self.patches[-1].squareAcceptance, 'triangleAcceptance: ', self.patches[-1].triangleAcceptance, ' projectionOfCcornerToBeam: ', projectionOfCcornerToBeam,'notChoppedPatch',notChoppedPatch)
                 if (not notChoppedPatch) and (self.patches[-1].c_corner[1] > -self.env.trapezoid_edges[self.env.num_layers-1]) and (projectionOfCcornerToBeam < self.env.beam_axis_lim):
                     complementary_apexZ0 = self.patches[-1].superpoints[0].min
@@ -1153,16 +1621,17 @@ class wedgeCover():
                     else:
                         print('z_top_min before:', z_top_min, 'superpoints[self.env.num_layers-1].min:', self.patches[-1].superpoints[self.env.num_layers-1].min)
                         z_top_min = max(-self.env.top_layer_lim, self.patches[-1].superpoints[self.env.num_layers-1].min)
-                    self.makePatch_alignedToLine(apexZ0 = complementary_apexZ0, ppl = ppl, z_top = z_top_min, leftRight=True)
+                    #the complementary patch is only a candidate until the white space loop settles on one
+                    complementary = self.evaluate_patch(apexZ0 = complementary_apexZ0, ppl = ppl, z_top = z_top_min, leftRight=True)
                     madeComplementaryPatch = True
-                    print('complementary: ', self.patches[-1].a_corner, ' for z_top_min:', z_top_min)
-                    print('complementary: ', self.patches[-1].b_corner,'for patch',len(self.patches))
-                    print('complementary: ', self.patches[-1].c_corner)
-                    print('complementary: ', self.patches[-1].d_corner)
-                    #complementary_a = self.get_index_from_z(self.env.num_layers-1, self.patches[-1].a_corner[1], 'above')
-                    #complementary_b = self.get_index_from_z(self.env.num_layers-1, self.patches[-1].b_corner[1], 'above')
-                    complementary_a = self.patches[-1].a_corner[1]
-                    complementary_b = self.patches[-1].b_corner[1]
+                    print('complementary: ', complementary.a_corner, ' for z_top_min:', z_top_min)
+                    print('complementary: ', complementary.b_corner,'for patch',len(self.patches)+1)
+                    print('complementary: ', complementary.c_corner)
+                    print('complementary: ', complementary.d_corner)
+                    #complementary_a = self.get_index_from_z(self.env.num_layers-1, complementary.a_corner[1], 'above')
+                    #complementary_b = self.get_index_from_z(self.env.num_layers-1, complementary.b_corner[1], 'above')
+                    complementary_a = complementary.a_corner[1]
+                    complementary_b = complementary.b_corner[1]
                     white_space_height = max(original_c - complementary_a, original_d - complementary_b)
                     previous_white_space_height = -1
                     counter = 0
@@ -1173,83 +1642,68 @@ class wedgeCover():
                     #while (counterUpshift < 100) and (white_space_height != 0) and ((counter < 15) or (white_space_height > 0)) and (self.patches[-1].c_corner[1] > -self.env.trapezoid_edges[self.env.num_layers-1]):
                     
                     #while not((white_space_height < 0) and (previous_white_space_height >= 0)) and ((self.patches[-1].c_corner[1] > -self.env.trapezoid_edges[self.env.num_layers-1]) or (white_space_height > 0)) and (current_z_top_index < (len(self.data.array[self.env.num_layers-1])-1)) and (self.patches[-2].triangleAcceptance == False) :
-                    while not((white_space_height <= 0) and (previous_white_space_height >= 0)) and (abs(white_space_height)>0.000001) and ((self.patches[-1].c_corner[1] > -self.env.trapezoid_edges[self.env.num_layers-1]) or (white_space_height > 0)) and (current_z_top_index < (len(self.data.array[self.env.num_layers-1])-1)) and not(repeat_patch) and not(repeat_original):
+                    # white_space_height changes sign once along the steps of the loop, so skip ahead to where it 
+                    # stops or turns around with a galloping search instead of making the patch of every step
+                    if not(repeat_patch) and not(repeat_original):
+                        complementary, z_top_min, previous_z_top_min, current_z_top_index, white_space_height, previous_white_space_height, skipped, evaluations = self.skipWhiteSpaceSteps(
+                            original_c, original_d, complementary_apexZ0, ppl, complementary, z_top_min, white_space_height)
+                        self.white_space_steps[-1]['steps'] += skipped
+                        self.white_space_steps[-1]['evaluations'] += evaluations
+                        if skipped > 0:
+                            complementary_a = complementary.a_corner[1]
+                            complementary_b = complementary.b_corner[1]
+                            print('skipped', skipped, 'white space steps with', evaluations, 'complementary patches, z_top_min:', z_top_min, 'white_space_height:', white_space_height)
+                    while self.whiteSpaceLoopContinues(white_space_height, previous_white_space_height, complementary, current_z_top_index) and not(repeat_patch) and not(repeat_original):
                         print()
-                        if (len(self.patches) > 2):
-                            print('original c:', original_c, ' ', self.patches[-2].c_corner[1], '|| original d:', original_d, ' ', self.patches[-2].d_corner[1])
-                        print('complementary_a:', complementary_a, ' ', self.patches[-1].a_corner[1], ' || complementary_b:', complementary_b, ' ', self.patches[-1].b_corner[1])
-                        current_z_top_index = self.get_index_from_z(self.env.num_layers-1, z_top_min)
+                        if (len(self.patches) > 1):
+                            print('original c:', original_c, ' ', original.c_corner[1], '|| original d:', original_d, ' ', original.d_corner[1])
+                        print('complementary_a:', complementary_a, ' ', complementary.a_corner[1], ' || complementary_b:', complementary_b, ' ', complementary.b_corner[1])
                         print('current white_space_height: ', white_space_height)
                         print('counter: ',counter, ' counterUpshift: ', counterUpshift)
-                        print('orig_ztop: ', current_z_top_index, 'orig_z_top_min: ', z_top_min)
-                        current_z_i_index = tuple(self.get_index_from_z(
-                            layer,
-                            self.patches[-1].straightLineProjectorFromLayerIJtoK(complementary_apexZ0,z_top_min,1,self.env.num_layers,layer+1)
-                            ) for layer in range(self.env.num_layers))
-                        if (z_top_min == previous_z_top_min):
-                            current_z_top_index += 1
-                            new_z_i_index = tuple(oldIndex+1 for oldIndex in current_z_i_index)
-                        previous_z_top_min = z_top_min
+                        print('orig_ztop: ', self.get_index_from_z(self.env.num_layers-1, z_top_min), 'orig_z_top_min: ', z_top_min)
                         if (white_space_height < 0):
                             counter +=1
-                            current_z_top_index -= 1
-                            new_z_i_index = tuple(oldIndex-1 for oldIndex in current_z_i_index)
                         else:
                             counterUpshift += 1
-                            current_z_top_index += 1
-                            new_z_i_index = tuple(oldIndex+1 for oldIndex in current_z_i_index)
-                        current_z_top_index = min(current_z_top_index,len(self.data.array[self.env.num_layers-1])-1)
-                        new_z_i_index = tuple(min(z_i_index,len(self.data.array[layer])-1) for layer, z_i_index in enumerate(new_z_i_index)) 
-                        new_z_i_index = tuple(max(z_i_index,0) for layer, z_i_index in enumerate(new_z_i_index))
-                        new_z_i = tuple(self.data.array[layer][new_z_i_index[layer]].z for layer in range(self.env.num_layers))
-                        new_z_i_atTop = tuple(self.patches[-1].straightLineProjectorFromLayerIJtoK(complementary_apexZ0,new_z_i[layer],1,layer+1,self.env.num_layers) for layer in range(1,self.env.num_layers))
-                        layerWithSmallestShift = 1 + np.argmin(np.abs(np.array(new_z_i_atTop)-previous_z_top_min))
+                        new_z_top_min, current_z_top_index, new_z_i_index, new_z_i_atTop, layerWithSmallestShift = self.whiteSpaceStep(
+                            complementary, complementary_apexZ0, z_top_min, previous_z_top_min, white_space_height)
+                        previous_z_top_min = z_top_min
+                        z_top_min = new_z_top_min
                         for layer in range(self.env.num_layers-1):
                             print (layer+1, ' new_z_i_atTop: ', new_z_i_atTop[layer], ' shift_i_ztop: ', new_z_i_atTop[layer]-previous_z_top_min,
                                 ' layerWithSmallestShift: ', layerWithSmallestShift)
-                        z_top_min = self.data.array[self.env.num_layers-1][current_z_top_index].z
-                        z_top_min = new_z_i_atTop[layerWithSmallestShift-1] # AVK try smallest shift
-                        if abs(z_top_min-previous_z_top_min) < 0.000001:
-                            z_top_min = self.data.array[self.env.num_layers-1][current_z_top_index].z
-                        if abs(z_top_min-previous_z_top_min) < 0.000001:
-                            z_top_min = self.data.array[self.env.num_layers-2][current_z_top_index].z
-                        if abs(z_top_min-previous_z_top_min) < 0.000001:
-                            z_top_min = self.data.array[self.env.num_layers-3][current_z_top_index].z
-                        if ((z_top_min-previous_z_top_min)*(white_space_height)) < 0:
-                            z_top_min = new_z_i_atTop[self.env.num_layers-2]
-                        print('new_def_z_top_min_diff:',z_top_min-self.data.array[self.env.num_layers-1][current_z_top_index].z)
+                        print('new_def_z_top_min_diff:',z_top_min-self.data.z[self.env.num_layers-1][current_z_top_index])
                         print('new_ztop_index: ', current_z_top_index, ' new_z_i_index: ', new_z_i_index, ' new_z_top_min: ', z_top_min, ' shift_ztop:', z_top_min-previous_z_top_min)
-                        nPatchesAtComplementary = len(self.patches)
-                        if (nPatchesAtComplementary > nPatchesAtOriginal):
-                            print('deleted complementary: ', self.patches[-1].a_corner, 'for patch',len(self.patches))
-                            print('deleted complementary: ', self.patches[-1].b_corner)
-                            print('deleted complementary: ', self.patches[-1].c_corner)
-                            print('deleted complementary: ', self.patches[-1].d_corner)
-                            #del self.patches[-1]
-                            self.delete_patch(-1)
-                            self.n_patches -= 1
-                        self.makePatch_alignedToLine(apexZ0 = complementary_apexZ0, ppl = ppl, z_top = z_top_min, leftRight=True)
-                        #complementary_a = self.get_index_from_z(self.env.num_layers-1, self.patches[-1].a_corner[1], 'above')
-                        #complementary_b = self.get_index_from_z(self.env.num_layers-1, self.patches[-1].b_corner[1], 'above')
-                        complementary_a = self.patches[-1].a_corner[1]
-                        complementary_b = self.patches[-1].b_corner[1]
+                        print('deleted complementary: ', complementary.a_corner, 'for patch',len(self.patches)+1)
+                        print('deleted complementary: ', complementary.b_corner)
+                        print('deleted complementary: ', complementary.c_corner)
+                        print('deleted complementary: ', complementary.d_corner)
+                        self.n_discarded_patches += 1
+                        self.white_space_steps[-1]['steps'] += 1
+                        self.white_space_steps[-1]['evaluations'] += 1
+                        complementary = self.evaluate_patch(apexZ0 = complementary_apexZ0, ppl = ppl, z_top = z_top_min, leftRight=True)
+                        #complementary_a = self.get_index_from_z(self.env.num_layers-1, complementary.a_corner[1], 'above')
+                        #complementary_b = self.get_index_from_z(self.env.num_layers-1, complementary.b_corner[1], 'above')
+                        complementary_a = complementary.a_corner[1]
+                        complementary_b = complementary.b_corner[1]
                         previous_white_space_height = white_space_height
                         white_space_height = max(original_c - complementary_a, original_d - complementary_b)
-                        print('complementary_a:', complementary_a, ' ', self.patches[-1].a_corner[1], ' || complementary_b:', complementary_b, ' ', self.patches[-1].b_corner[1], ' new z_top_min: ', z_top_min)
+                        print('complementary_a:', complementary_a, ' ', complementary.a_corner[1], ' || complementary_b:', complementary_b, ' ', complementary.b_corner[1], ' new z_top_min: ', z_top_min)
                         print('new white_space_height: ', white_space_height)
-                        print('adjusted complementary: ', self.patches[-1].a_corner, ' for z_top_min:', z_top_min)
-                        print('adjusted complementary: ', self.patches[-1].b_corner, 'for patch',len(self.patches))
-                        print('adjusted complementary: ', self.patches[-1].c_corner)
-                        print('adjusted complementary: ', self.patches[-1].d_corner)
+                        print('adjusted complementary: ', complementary.a_corner, ' for z_top_min:', z_top_min)
+                        print('adjusted complementary: ', complementary.b_corner, 'for patch',len(self.patches)+1)
+                        print('adjusted complementary: ', complementary.c_corner)
+                        print('adjusted complementary: ', complementary.d_corner)
+                    self.commit_patch(complementary)
                     if (self.n_patches > 3) and fix42:
                         if (self.patches[-1].superpoints[self.env.num_layers-1] == self.patches[-3].superpoints[self.env.num_layers-1]) and (self.patches[-1].superpoints[0] == self.patches[-3].superpoints[0]) and (self.patches[-1].superpoints[1] == self.patches[-3].superpoints[1]) and (self.patches[-1].superpoints[2] == self.patches[-3].superpoints[2]) and (self.patches[-1].superpoints[3] == self.patches[-3].superpoints[3]):
                             repeat_patch = True
                             print (self.patches[-1].superpoints[self.env.num_layers-1].min, self.patches[-1].superpoints[self.env.num_layers-1].max, ' repeat_patch: ', repeat_patch)
                             #del self.patches[-1]
-                            self.delete_patch[-1]
+                            self.delete_patch(-1)
                             self.n_patches -= 1
                             current_z_top_index -= 1
-                            z_top_min = self.data.array[self.env.num_layers-1][current_z_top_index].z
+                            z_top_min = self.data.z[self.env.num_layers-1][current_z_top_index]
                             z_top_min = new_z_i_atTop[layerWithSmallestShift-1] # AVK try smallest shift    
                             self.makePatch_alignedToLine(apexZ0 = complementary_apexZ0, ppl = ppl, z_top = z_top_min, leftRight=True)
 
@@ -1298,6 +1752,8 @@ class wedgeCover():
                     newGapBottom = -0.000001
                     
                     makeHorizontallyShiftedPatch = False
+                    # whether add_patch would have added the last shifted candidate, see the loop below
+                    shiftedIsNew = False
                     shifted_Align = apexZ0
                     doShiftedPatch = True
                     # decide whether to shift original patch or complementary patch
@@ -1316,6 +1772,8 @@ class wedgeCover():
                         print('originalPartialTop:',originalPartialTop,'complementaryPartialTop:',complementaryPartialTop,'originalPartialBottom:',originalPartialBottom,'complementaryPartialBottom:',complementaryPartialBottom, original_topR_jL, original_topL_jL, complementary_topR_jR, complementary_topL_jR,'horizontalOverlapTop:',horizontalOverlapTop,'horizontalOverlapBottom:',horizontalOverlapBottom)
                     while ((horizontalShiftTop > 0 and originalPartialTop and complementaryPartialTop) or (horizontalShiftBottom > 0 and originalPartialBottom and complementaryPartialBottom)) and doShiftedPatch and (horizontalOverlapTop <= 0) and (horizontalOverlapBottom <= 0) and (newGapTop<0 or newGapBottom<0):
                         print('horizontalShifts:',horizontalShiftTop,horizontalShiftBottom, 'shifted_Align:',shifted_Align)
+                        if self.stats is not None: 
+                            self.stats.counts['horizontal_shift_steps'] += 1
                         newZtop = z_top_max
                         if shiftOriginal:
                             shifted_Align -= max(horizontalShiftTop,horizontalShiftBottom) #+ min(newGapTop,newGapBottom)
@@ -1323,25 +1781,31 @@ class wedgeCover():
                             shifted_Align += max(horizontalShiftTop,horizontalShiftBottom)
                             newZtop = z_top_min
                         if (makeHorizontallyShiftedPatch):  
-                            #del self.patches[-1]
-                            self.delete_patch(-1)                                                                                          
-                            self.n_patches -= 1                        
-                        self.makePatch_alignedToLine(apexZ0 = shifted_Align, ppl = ppl, z_top = newZtop, leftRight = (not shiftOriginal))
-                        self.patches[-1].getShadows(z_top_min,z_top_max)
+                            if shiftedIsNew:
+                                self.n_discarded_patches += 1
+                            else:
+                                # this loop used to add every shifted patch and delete the last patch before the next one,
+                                # which deleted the real last patch when the shifted patch was not added as a repeat of it
+                                self.delete_patch(-1)
+                                self.n_patches -= 1
+                        #the shifted patch is only a candidate until the shifting stops
+                        shifted = self.evaluate_patch(apexZ0 = shifted_Align, ppl = ppl, z_top = newZtop, leftRight = (not shiftOriginal))
+                        shiftedIsNew = self.is_new_patch(shifted)
+                        shifted.getShadows(z_top_min,z_top_max)
                         if shiftOriginal:
-                            original_topR_jL = self.patches[-1].shadow_fromTopToInnermost_topR_jL
-                            original_topL_jL = self.patches[-1].shadow_fromTopToInnermost_topL_jL
-                            original_topR_jR = self.patches[-1].shadow_fromTopToInnermost_topR_jR
-                            original_topL_jR = self.patches[-1].shadow_fromTopToInnermost_topL_jR
+                            original_topR_jL = shifted.shadow_fromTopToInnermost_topR_jL
+                            original_topL_jL = shifted.shadow_fromTopToInnermost_topL_jL
+                            original_topR_jR = shifted.shadow_fromTopToInnermost_topR_jR
+                            original_topL_jR = shifted.shadow_fromTopToInnermost_topL_jR
                         else :
-                            complementary_topR_jR = self.patches[-1].shadow_fromTopToInnermost_topR_jR
-                            complementary_topL_jR = self.patches[-1].shadow_fromTopToInnermost_topL_jR
-                            complementary_topR_jL = self.patches[-1].shadow_fromTopToInnermost_topR_jL
-                            complementary_topL_jL = self.patches[-1].shadow_fromTopToInnermost_topL_jL
+                            complementary_topR_jR = shifted.shadow_fromTopToInnermost_topR_jR
+                            complementary_topL_jR = shifted.shadow_fromTopToInnermost_topL_jR
+                            complementary_topR_jL = shifted.shadow_fromTopToInnermost_topR_jL
+                            complementary_topL_jL = shifted.shadow_fromTopToInnermost_topL_jL
 
                         horizontalShiftTop = original_topR_jL - complementary_topR_jR
                         horizontalShiftBottom = original_topL_jL - complementary_topL_jR
-                        if (shiftOriginal and self.patches[-1].straightLineProjectorFromLayerIJtoK(original_topR_jR,z_top_max,1,self.env.num_layers,0)<self.env.beam_axis_lim):
+                        if (shiftOriginal and shifted.straightLineProjectorFromLayerIJtoK(original_topR_jR,z_top_max,1,self.env.num_layers,0)<self.env.beam_axis_lim):
                             horizontalOverlapTop = max(complementary_topR_jL - original_topR_jL, complementary_topR_jR - original_topR_jR)
                             horizontalOverlapBottom = max(complementary_topL_jL - original_topL_jL, complementary_topL_jR - original_topL_jR)
                             print('horizontalOverlapTop:',horizontalOverlapTop,'horizontalOverlapBottom:',horizontalOverlapBottom)
@@ -1369,6 +1833,7 @@ class wedgeCover():
                         makeHorizontallyShiftedPatch = True
                         print('updated_horizontalShifts:',horizontalShiftTop,horizontalShiftBottom, 'shifted_Align:',shifted_Align)
                     if (makeHorizontallyShiftedPatch):
+                        self.commit_patch(shifted)
                         if ((self.patches[-1].straightLineProjectorFromLayerIJtoK(shifted_Align,newZtop,1,self.env.num_layers,0) > self.env.beam_axis_lim)) and shiftOriginal:
                             if (len(self.patches) > 2):
                                 #del self.patches[-3]
@@ -1383,6 +1848,7 @@ class wedgeCover():
 
             apexZ0 = self.patches[-1].c_corner[0]
             apexZ0 = saved_apexZ0
+            print('white space steps:', self.white_space_steps[-1]['steps'], 'complementary patches:', self.white_space_steps[-1]['evaluations'])
             print('=======================================================  z1_Align: ', apexZ0)
         #for i in range(3):
             #del self.patches[-1]                                                                                                  
@@ -1451,7 +1917,7 @@ class wedgeCover():
                 #while (counterUpshift < 100) and (white_space_height != 0) and ((counter < 15) or (white_space_height > 0)) and (self.patches[-1].c_corner[1] > -self.env.trapezoid_edges[self.env.num_layers-1]):
                 
                 #while not((white_space_height < 0) and (previous_white_space_height >= 0)) and ((self.patches[-1].c_corner[1] > -self.env.trapezoid_edges[self.env.num_layers-1]) or (white_space_height > 0)) and (current_z_top_index < (len(self.data.array[self.env.num_layers-1])-1)) and (self.patches[-2].triangleAcceptance == False) :
-                while not((white_space_height <= 0) and (previous_white_space_height >= 0)) and ((self.patches[-1].b_corner[1] < self.env.trapezoid_edges[self.env.num_layers-1]) or (white_space_height > 0)) and (current_z_top_index < (len(self.data.array[self.env.num_layers-1])-1)) :
+                while not((white_space_height <= 0) and (previous_white_space_height >= 0)) and ((self.patches[-1].b_corner[1] < self.env.trapezoid_edges[self.env.num_layers-1]) or (white_space_height > 0)) and (current_z_top_index < (len(self.data.z[self.env.num_layers-1])-1)) :
                     print()
                     if (len(self.patches) > 2):
                         print('original_a:', original_a, ' ', self.patches[-2].a_corner[1], '|| original_b:', original_b, ' ', self.patches[-2].b_corner[1])
@@ -1466,9 +1932,9 @@ class wedgeCover():
                     else:
                         counter +=1
                         current_z_top_index -= 1
-                    print('new ztop: ', current_z_top_index, ' arrayLength: ', len(self.data.array[self.env.num_layers-1]))
-                    current_z_top_index = min(current_z_top_index,len(self.data.array[self.env.num_layers-1])-1)
-                    z_top_max = self.data.array[self.env.num_layers-1][current_z_top_index].z
+                    print('new ztop: ', current_z_top_index, ' arrayLength: ', len(self.data.z[self.env.num_layers-1]))
+                    current_z_top_index = min(current_z_top_index,len(self.data.z[self.env.num_layers-1])-1)
+                    z_top_max = self.data.z[self.env.num_layers-1][current_z_top_index]
                     #del self.patches[-1]
                     self.delete_patch(-1)
                     self.n_patches -= 1
@@ -1638,29 +2104,50 @@ class wedgeCover():
         #print(self.n_patches)
         
     def makePatch_alignedToLine(self, apexZ0 = 0, z_top = -50, ppl = 16, leftRight = True, double_middleLayers_ppl = False):
+        # makes the patch of evaluate_patch and adds it to the cover
+        if self.stats is not None: 
+            self.stats.counts['makePatch_alignedToLine'] += 1
+        self.commit_patch(self.evaluate_patch(apexZ0 = apexZ0, z_top = z_top, ppl = ppl, leftRight = leftRight, double_middleLayers_ppl = double_middleLayers_ppl))
+
+    def evaluate_patch(self, apexZ0 = 0, z_top = -50, ppl = 16, leftRight = True, double_middleLayers_ppl = False):
+        """Makes the patch aligned to the line from apexZ0 on layer 1 to z_top on the top layer without
+        adding it to the cover, so it can be tried and dropped without touching patches, all_patches
+        and real_patch_list. Its corners and shadows are computed when they are first read.
 
+        Args:
+            apexZ0 (num, optional): z of the line on layer 1. Defaults to 0.
+            z_top (num, optional): z of the line on the top layer. Defaults to -50.
+            ppl (int, optional): points per patch per layer. Defaults to 16.
+            leftRight (bool, optional): True for the superpoints to start at the line and go right, 
+                False to end at it. Defaults to True.
+            double_middleLayers_ppl (bool, optional): True for 2*ppl-1 points in the middle layers. 
+                Defaults to False.
+
+        Returns:
+            wedgePatch: the candidate patch, see commit_patch
+        """
+        if self.stats is not None: 
+            self.stats.counts['evaluate_patch'] += 1
+            self.stats.counts['hit_lookups'] += self.env.num_layers
         init_patch = []
         original_ppl = ppl
         alignmentAccuracy = 0.00001 # 0.1 micron
 
-        #row_data[layer] contains spacepoints for each layer
-        row_data = self.data.array
         #loops through each layer and picks n points closest to (z0, 0) and (-100, 25)
         #for row in range(self.env.num_layers-1,-1,-1):
         for row in range(self.env.num_layers):
             y = self.env.radii[row]
-            #create compatible arrays from data structure
-            row_list = np.array([row_data[row][x].z for x in range(len(row_data[row]))])
+            #sorted z values of the layer
+            row_list = self.data.z[row]
             #picks picks n points closest to line from (z0, 0) to (-100, 25) (top left point)
             r_max = self.env.radii[-1]
             #start_index = np.argmin(np.abs((row_list - ((z_top-apexZ0)*y/r_max + apexZ0))))
             #start_value = row_list[start_index] - ((z_top-apexZ0)*y/r_max + apexZ0)
             projectionToRow = (z_top-apexZ0)*(y-self.env.radii[0])/(r_max-self.env.radii[0]) + apexZ0 # apexZ0 is actually defined at layer1
-            start_index = np.argmin(np.abs((row_list - projectionToRow)))
+            start_index = closestIndex(row_list, projectionToRow)
             start_value = row_list[start_index] - projectionToRow
 
-            left_bound = np.argmin(np.abs((row_list + self.env.trapezoid_edges[row] + self.env.boundaryPoint_offset)))
-            right_bound = np.argmin(np.abs((row_list - self.env.trapezoid_edges[row] - self.env.boundaryPoint_offset)))
+            left_bound, right_bound = self.data.trapezoidBounds(row, self.env.trapezoid_edges[row] + self.env.boundaryPoint_offset)
 
             if (double_middleLayers_ppl == True) & (row != 0) & (row!=self.env.num_layers-1):
                 ppl = original_ppl * 2 - 1
@@ -1675,9 +2162,9 @@ class wedgeCover():
                     pass
                 #add superpoint to patch
                 if start_index + ppl > right_bound + 1:
-                    init_patch.append(wedgeSuperPoint(row_data[row][right_bound+1-ppl:right_bound+1]))
+                    init_patch.append(wedgeSuperPoint(self.data, row, right_bound+1-ppl, right_bound+1))
                 else:
-                    init_patch.append(wedgeSuperPoint(row_data[row][start_index:start_index+ppl]))
+                    init_patch.append(wedgeSuperPoint(self.data, row, start_index, start_index+ppl))
 
             else:
                 #add one to stop index in case it is left of the line from (z0, 0) to (100, 25)
@@ -1689,140 +2176,144 @@ class wedgeCover():
                         print('row',row+1,'updated start_index',start_index,'start_value',start_value,'z:',row_list[start_index])
                 #add superpoint to patch 
                 if start_index - ppl + 1 < left_bound:
-                    init_patch.append(wedgeSuperPoint(row_data[row][left_bound:left_bound+ppl]))
+                    init_patch.append(wedgeSuperPoint(self.data, row, left_bound, left_bound+ppl))
                 else:
-                    init_patch.append(wedgeSuperPoint(row_data[row][start_index-ppl+1:start_index+1]))
+                    init_patch.append(wedgeSuperPoint(self.data, row, start_index-ppl+1, start_index+1))
                     
             #if (row == self.env.num_layers-1):
                 # update z_top to the nearest point's coordinate in outermost layer so that other layers' points are accurately aligned
                 #z_top = row_list[start_index]                
                 
         #init_patch.reverse() # reverse the order of rows to make ascending order
-        #add patch to cover
-        self.add_patch(wedgePatch(self.env, tuple(init_patch), apexZ0=apexZ0))
+        return wedgePatch(self.env, tuple(init_patch), apexZ0=apexZ0)
 
 
     def makePatches_Projective_Loop(self, apexZ0 = 0, stop = 1, ppl = 16, leftRight = True):
             """Loop for creating patches left to right or right to left depending on argument leftRight
 
+            The lambdaZ = (z-apexZ0)/r of every hit comes from the lambdaZ index of the DataSet and the
+            stopping index of every layer only depends on apexZ0, so both are computed once, and the hit 
+            closest to the line of each new patch is found with a binary search instead of a scan of the 
+            whole layer.
+
             Args:
                 apexZ0 (num, optional): Places to generate patch. Defaults to 0.
                 stop (num, optional): stopping location, normalized to 1m. Defaults to 1.
                 ppl (int, optional): points per patch per layer. Defaults to 16.
                 leftRight(Bool): If set to true, make patches from left to right, if false, then make from right to left
-
-            Returns:
-                function: reruns loop if it hasn't reached the end of the dataset
             """
-            #count how many times this has been run
-            loops = self.n_patches - 1
-            #reads last patch made
-            last_patch = self.patches[loops].superpoints
-            #create list for points closest to starting line and patch ingredients
-            lambdaZ_list = []
-            patch_ingredients = []
-            #creates count for terminating patch making. loop stops when all layers are beyond line from (z0, 0) to (100, 25)
-            term = 0
-
-            #loops through layers
-            for i in range(self.env.num_layers):
-                y = self.env.radii[i]
-                #create compatible arrays from data structure
-                row_data = last_patch[i].points
-                row_list = np.array([row_data[x].z for x in range(len(row_data))])
-                #rescales point for layer and add to mins list
-                if leftRight == True:
-                    lambdaZ = (row_list[ppl-1]-apexZ0)/y 
-                else:
-                    lambdaZ = (row_list[0]-apexZ0)/(y)
-                lambdaZ_list.append(lambdaZ)
-
-            #find which layer of the next n points from last patch stops first and find rescaled value of that point
-            if leftRight == True:
-                end_index = np.argmin(lambdaZ_list)
-                min_lambdaZ = min(lambdaZ_list)
-            else:
-                end_index = np.argmax(lambdaZ_list)
-                min_lambdaZ = max(lambdaZ_list)
-
-            self.patches[loops].add_end(end_index+1)
-
             r_max = self.env.radii[-1]
             z_max = self.env.top_layer_lim
 
-            #row_data[layer] gives spacepoints in layer
-            row_data = self.data.array
-            #loops through layers again
+            #index past which each layer has reached the line from (z0, 0) to (100*stop, 25)
+            if self.stats is not None: 
+                self.stats.counts['hit_lookups'] += self.env.num_layers
+            stop_indices = []
             for i in range(self.env.num_layers):
                 y = self.env.radii[i]
-                row_list = np.array([row_data[i][x].z for x in range(len(row_data[i]))])
-                #finds point closest to line from (z0, 0) to leftmost rescaled point
-                closest_index = np.argmin(np.abs((row_list-apexZ0)/(y) - min_lambdaZ))
-                #find where the stopping index is based on the line from (z0, 0) to z-edge of outermost layer
+                row_list = self.data.z[i]
                 if leftRight == True:
-                    stop_index = np.argmin(np.abs(row_list - (stop*(z_max-apexZ0)*y/r_max + apexZ0)))
-
+                    stop_index = closestIndex(row_list, stop*(z_max-apexZ0)*y/r_max + apexZ0)
                     #add one to stop index in case it is left of the line from (z0, 0) to (100*stop, 25)
                     #this makes sure there is full coverage
                     if stop_index != len(row_list)-1:
                         stop_index += 1
+                else:
+                    stop_index = closestIndex(row_list, stop*(z_max+apexZ0)*y/r_max+apexZ0)
+                    if stop_index != 0: 
+                        stop_index -= 1
+                stop_indices.append(stop_index)
 
-                    #checks to see if patch will go past stop index, if so, add one to term variable
-                    if closest_index + ppl - 1 > stop_index:
-                        term += 1
-
-
-                    #if there is not enough points left, pick last n points
-                    if closest_index + ppl - 1 > len(row_list):
-                        patch_ingredients.append(wedgeSuperPoint(row_data[i][len(row_list)-ppl:]))
-                    
-                    #if there are enough points left, pick point closest to slope and next n-1 points
+            while True:
+                #reads last patch made
+                loops = self.n_patches - 1
+                last_patch = self.patches[loops].superpoints
+                #create list for points closest to starting line and patch ingredients
+                lambdaZ_list = []
+                patch_ingredients = []
+                #creates count for terminating patch making. loop stops when all layers are beyond line from (z0, 0) to (100, 25)
+                term = 0
+
+                #loops through layers
+                for i in range(self.env.num_layers):
+                    y = self.env.radii[i]
+                    #z values of the last patch's superpoint in this layer
+                    row_list = last_patch[i].z_values
+                    #rescales point for layer and add to mins list
+                    if leftRight == True:
+                        lambdaZ = (row_list[ppl-1]-apexZ0)/y 
                     else:
-                        #makes sure there won't be an error of negative indices
-                        if closest_index == 0:
-                            closest_index = 1
-                        #closest_index - 1 insures point is to left of line ie ensuring patches overlap
-                        patch_ingredients.append(wedgeSuperPoint(row_data[i][closest_index-1:closest_index + ppl - 1]))
-                    #print(term)
+                        lambdaZ = (row_list[0]-apexZ0)/(y)
+                    lambdaZ_list.append(lambdaZ)
+
+                #find which layer of the next n points from last patch stops first and find rescaled value of that point
+                if leftRight == True:
+                    end_index = np.argmin(lambdaZ_list)
+                    min_lambdaZ = min(lambdaZ_list)
                 else:
-                    stop_index = np.argmin(np.abs(row_list - (stop*(z_max+apexZ0)*y/r_max+apexZ0)))
-                    #for the extremely specific condition where two z's are equal and it is the edgepoint
-                    try:
-                        if row_list[closest_index] == row_list[closest_index+1]:
+                    end_index = np.argmax(lambdaZ_list)
+                    min_lambdaZ = max(lambdaZ_list)
+
+                self.patches[loops].add_end(end_index+1)
+
+                #one closestLambdaZ lookup per layer below
+                if self.stats is not None:
+                    self.stats.counts['hit_lookups'] += self.env.num_layers
+                #loops through layers again
+                for i in range(self.env.num_layers):
+                    row_list = self.data.z[i]
+                    stop_index = stop_indices[i]
+                    #finds point closest to line from (z0, 0) to leftmost rescaled point
+                    closest_index = self.data.closestLambdaZ(i, apexZ0, min_lambdaZ)
+                    if leftRight == True:
+                        #checks to see if patch will go past stop index, if so, add one to term variable
+                        if closest_index + ppl - 1 > stop_index:
+                            term += 1
+
+                        #if there is not enough points left, pick last n points
+                        if closest_index + ppl - 1 > len(row_list):
+                            patch_ingredients.append(wedgeSuperPoint(self.data, i, len(row_list)-ppl, None))
+                        
+                        #if there are enough points left, pick point closest to slope and next n-1 points
+                        else:
+                            #makes sure there won't be an error of negative indices
+                            if closest_index == 0:
+                                closest_index = 1
+                            #closest_index - 1 insures point is to left of line ie ensuring patches overlap
+                            patch_ingredients.append(wedgeSuperPoint(self.data, i, closest_index-1, closest_index + ppl - 1))
+                    else:
+                        #for the extremely specific condition where two z's are equal and it is the edgepoint
+                        if (closest_index + 1 < len(row_list)) and (row_list[closest_index] == row_list[closest_index+1]):
                             closest_index = closest_index + 1 
-                    except:
-                        pass
 
-                    if stop_index != 0: 
-                        stop_index -= 1
-                    #checks to see if patch will go past stop index, if so, add one to term variable
-                    if closest_index - ppl + 2 <= stop_index:
-                        term += 1
+                        #checks to see if patch will go past stop index, if so, add one to term variable
+                        if closest_index - ppl + 2 <= stop_index:
+                            term += 1
 
-                    #if there aren't enough points left, pick leftmost n points
-                    if closest_index + 2 < ppl:
-                        patch_ingredients.append(wedgeSuperPoint(row_data[i][:ppl]))
+                        #if there aren't enough points left, pick leftmost n points
+                        if closest_index + 2 < ppl:
+                            patch_ingredients.append(wedgeSuperPoint(self.data, i, None, ppl))
 
-                    #if there are enough points left, pick point closest to slope and n-1 points to the left
-                    else:
-                        #makes sure there won't be an error of indices beyond length of list
-                        if closest_index == len(row_list) - 1:
-                            closest_index -=1
-                        #closest_index + 2 ensures point is to right of line ie ensures patches overlap
-                        patch_ingredients.append(wedgeSuperPoint(row_data[i][closest_index - ppl + 2:closest_index + 2]))
-                    #print(term)
-            #add superpoints to patch
-            new_patch = wedgePatch(self.env, tuple(patch_ingredients), apexZ0=apexZ0)
-            #add patch to cover
-            self.add_patch(new_patch)
-            
-            #if all layers have points beyond stop index, stop
-            if term == 5:
-                return
-            #if new patches are still being created, repeat loop
-            else:
-                return self.makePatches_Projective_Loop(apexZ0, stop, ppl = ppl, leftRight = leftRight)
+                        #if there are enough points left, pick point closest to slope and n-1 points to the left
+                        else:
+                            #makes sure there won't be an error of indices beyond length of list
+                            if closest_index == len(row_list) - 1:
+                                closest_index -=1
+                            #closest_index + 2 ensures point is to right of line ie ensures patches overlap
+                            patch_ingredients.append(wedgeSuperPoint(self.data, i, closest_index - ppl + 2, closest_index + 2))
+                #add superpoints to patch
+                new_patch = wedgePatch(self.env, tuple(patch_ingredients), apexZ0=apexZ0)
+                #add patch to cover
+                self.add_patch(new_patch)
+                
+                #if all layers have points beyond stop index, stop
+                if term == 5:
+                    return
+                #add_patch drops a patch identical to the last one, which would then be rebuilt forever
+                if self.n_patches - 1 == loops:
+                    return
             
+
     def makePatches_Projective(self, apexZ0 = 0, stop = 1, ppl = 16, leftRight = True):
         """Creates patches left to right or right to left depending on argument leftRight
 
@@ -1857,7 +2348,7 @@ class wedgeCover():
                 if start_index != 0:
                     start_index -= 1
                 #add superpoint to patch
-                init_patch.append(wedgeSuperPoint(row_data[row][start_index:start_index+ppl]))
+                init_patch.append(wedgeSuperPoint(self.data, row, start_index, start_index+ppl))
             else:
                 start_index = np.argmin(np.abs((row_list - ((z_max-apexZ0)*y/r_max + apexZ0))))
                 #add one to stop index in case it is left of the line from (z0, 0) to (100, 25)
@@ -1891,27 +2382,28 @@ class wedgeCover():
         #create list for inital patch
         init_patch = []
         r_max = self.env.radii[-1]
+        if self.stats is not None: 
+            self.stats.counts['hit_lookups'] += self.env.num_layers
         #loops through layers and picks picks 16 points closest to (z0, 0) and (0, center) 
         for row in range(self.env.num_layers):
             y = self.env.radii[row]
-            #create compatible array from data structure
-            row_data = self.data.array
-            row_list = np.array([row_data[row][x].z for x in range(len(row_data[row]))])
+            #sorted z values of the layer
+            row_list = self.data.z[row]
             #picks n/2 points left and right of point closest to line from (0, 0) to (center, 25)
-            center_index = np.argmin(np.abs(row_list - ((y*(center-apexZ0)/r_max)+apexZ0)))
+            center_index = closestIndex(row_list, (y*(center-apexZ0)/r_max)+apexZ0)
             #conditionals make sure no negative indices indices past length of array
 
             if (center_index-int(ppl/2)) < 0:
                 center_index = int(ppl/2)
                 #init_patch.append(wedgeSuperPoint(row_data[row][center_index-int(n/2):center_index+int(n/2)])) #DONT COMMENT IN BUT IS AN ALTERNATIVE
-            elif (center_index+int(ppl/2)) > len(self.data.array[row]):
-                center_index = len(self.data.array[row]) - int(ppl/2)
+            elif (center_index+int(ppl/2)) > len(row_list):
+                center_index = len(row_list) - int(ppl/2)
 
                 #init_patch.append(wedgeSuperPoint(row_data[row][len(self.data.array-16:len(self.data.array)])) #DONT COMMENT IN BUT IS AN ALTERNATIVE
-            if (self.data.array[row][center_index].z >= 0) or (center_index+16 == len(row_list)):
-                init_patch.append(wedgeSuperPoint(row_data[row][center_index-int(ppl/2):center_index+int(ppl/2)]))
+            if (row_list[center_index] >= 0) or (center_index+16 == len(row_list)):
+                init_patch.append(wedgeSuperPoint(self.data, row, center_index-int(ppl/2), center_index+int(ppl/2)))
             else:
-                init_patch.append(wedgeSuperPoint(row_data[row][center_index-int(ppl/2)+1:center_index+int(ppl/2)+1]))            
+                init_patch.append(wedgeSuperPoint(self.data, row, center_index-int(ppl/2)+1, center_index+int(ppl/2)+1))            
             
             #init_patch.append(wedgeSuperPoint(row_data[row][center_index-int(ppl/2):center_index+int(ppl/2)]))
         #add initial patch
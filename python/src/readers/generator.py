@@ -0,0 +1,110 @@
+from src.coverers.data_structs import Environment
+from src.readers.reader import writeBinary
+import numpy as np
+from src.debug import *
+
+def layerExtents(env:Environment, detector_length:float = None):
+    # half length in z of every layer, by default the trapezoid edges of env so that every hit can be covered
+    if detector_length is None:
+        return np.array(env.trapezoid_edges)
+    return np.full(env.num_layers, detector_length/2.0)
+
+def generateWedges(n_wedges:int, env:Environment = None, seed:int = 0, tracks:float = 150., noise:float = 15.,
+                   efficiency:float = 0.98, z0_sigma:float = 5., resolution:float = 0.001, wedge_phi:float = 2*np.pi/128,
+                   detector_length:float = None):
+    """Generates the hits of n_wedges synthetic wedges at once, in the (N, 4) array format of parseLines
+
+    Every wedge gets a Poisson number of straight tracks. Each one starts at a Gaussian z0 within the luminous
+    region and goes to a uniformly random z on the top layer. It leaves a hit with the given efficiency on
+    every layer it crosses inside the layer extent, smeared by the resolution. Poisson noise hits are spread
+    uniformly over every layer.
+
+    Args:
+        n_wedges (int): number of wedges
+        env (Environment, optional): radii, luminous region and top layer limits, Environment() if None.
+            Defaults to None.
+        seed (int, optional): seed of the random numbers, the same seed gives the same wedges. Defaults to 0.
+        tracks (float, optional): mean number of tracks per wedge. Defaults to 150.
+        noise (float, optional): mean number of noise hits per layer and wedge. Defaults to 15.
+        efficiency (float, optional): probability that a track leaves a hit on a layer. Defaults to 0.98.
+        z0_sigma (float, optional): standard deviation of z0, cut at beam_axis_lim. Defaults to 5.
+        resolution (float, optional): standard deviation of the hit z around the track. Defaults to 0.001.
+        wedge_phi (float, optional): phi range of a wedge. Defaults to 2*pi/128.
+        detector_length (float, optional): length in z of all layers, None uses the trapezoid edges of env.
+            Defaults to None.
+
+    Returns:
+        list: one (N, 4) array of layer, r, phi, z per wedge
+    """
+    if env is None:
+        env = Environment()
+    rng = np.random.default_rng(seed)
+    radii = np.array(env.radii)
+    extents = layerExtents(env, detector_length)
+
+    # tracks of all wedges together, wedge_of_track keeps them apart
+    n_tracks = rng.poisson(tracks, n_wedges)
+    wedge_of_track = np.repeat(np.arange(n_wedges), n_tracks)
+    z0 = np.clip(rng.normal(0., z0_sigma, len(wedge_of_track)), -env.beam_axis_lim, env.beam_axis_lim)
+    z_top = rng.uniform(-env.top_layer_lim, env.top_layer_lim, len(wedge_of_track))
+    phi = rng.uniform(0., wedge_phi, len(wedge_of_track))
+    z = z0[:, None] + (z_top - z0)[:, None]*radii[None, :]/radii[-1]
+    z = z + rng.normal(0., resolution, z.shape)
+    hit = (rng.random(z.shape) < efficiency) & (np.abs(z) <= extents[None, :])
+    track_hits = np.stack((np.broadcast_to(np.arange(1, env.num_layers+1), z.shape)[hit], np.broadcast_to(radii, z.shape)[hit],
+                           np.broadcast_to(phi[:, None], z.shape)[hit], z[hit]), axis=1)
+    track_wedges = np.broadcast_to(wedge_of_track[:, None], z.shape)[hit]
+
+    # noise hits of all wedges and layers together
+    n_noise = rng.poisson(noise, (n_wedges, env.num_layers))
+    noise_wedges = np.repeat(np.arange(n_wedges), n_noise.sum(axis=1))
+    noise_layers = np.concatenate([np.repeat(np.arange(env.num_layers), row) for row in n_noise] + [np.empty(0, dtype=int)])
+    noise_hits = np.stack((noise_layers + 1, radii[noise_layers], rng.uniform(0., wedge_phi, len(noise_layers)),
+                           rng.uniform(-extents[noise_layers], extents[noise_layers])), axis=1)
+
+    hits = np.concatenate((track_hits, noise_hits))
+    wedges = np.concatenate((track_wedges, noise_wedges))
+    order = np.argsort(wedges, kind='stable')
+    return np.split(hits[order], np.cumsum(np.bincount(wedges, minlength=n_wedges))[:-1])
+
+def iterWedges(n_wedges:int, chunk_size:int = 1024, seed:int = 0, **kwargs):
+    """Streams synthetic wedges chunk by chunk, so any number of them can be generated in bounded memory
+
+    Chunk k is generateWedges(..., seed=(seed, k)), so the wedges depend on seed and chunk_size.
+
+    Args:
+        n_wedges (int): number of wedges
+        chunk_size (int, optional): number of wedges generated at a time. Defaults to 1024.
+        seed (int, optional): seed of the random numbers. Defaults to 0.
+        kwargs: passed to generateWedges
+
+    Yields:
+        np.ndarray: (N, 4) array of layer, r, phi, z of each wedge
+    """
+    for k, start in enumerate(range(0, n_wedges, chunk_size)):
+        for hits in generateWedges(min(chunk_size, n_wedges - start), seed=(seed, k), **kwargs):
+            yield hits
+
+def writeWedges(filepath, n_wedges:int, chunk_size:int = 1024, seed:int = 0, binary:bool = True, dtype = np.float64, **kwargs):
+    """Writes synthetic wedges to a file that readFile and iterFile read like wedgeData files
+
+    Args:
+        filepath (str): path of the file, with binary a .bin file in the format of convertFile,
+            otherwise a text file of lines "(layer,r,phi,z),(layer,r,phi,z),..."
+        n_wedges (int): number of wedges
+        chunk_size (int, optional): number of wedges generated at a time. Defaults to 1024.
+        seed (int, optional): seed of the random numbers. Defaults to 0.
+        binary (bool, optional): False writes a text file. Defaults to True.
+        dtype (optional): np.float64 or np.float32 values of a binary file. Defaults to np.float64.
+        kwargs: passed to generateWedges
+
+    Returns:
+        str: path of the file
+    """
+    wedges = iterWedges(n_wedges, chunk_size=chunk_size, seed=seed, **kwargs)
+    if binary:
+        return writeBinary(filepath, wedges, dtype)
+    with open(filepath, "w") as f:
+        for hits in wedges:
+            f.write(",".join(f"({int(layer)},{r!r},{phi!r},{z!r})" for layer, r, phi, z in hits.tolist()) + "\n")
+    return filepath
@@ -1,42 +1,247 @@
 from src.coverers.data_structs import Environment, Point
+import numpy as np
+import copy
 import time
-from src.debug import * 
+import os
+from src.debug import *
 
 
-def readFile(filepath, stop:int = 128, performance:bool=False): 
-    # returns a list of wedges 
-    # Each wedge is represented by tuple (env, pnts) 
-    # env is an Environment, and pnts is a list of Points 
-    
-    start = time.time()
-    
-    # Create a list of events, with each event consisting of an environment and its list of Points 
-    events = [] 
-    with open(filepath) as f: 
+def parseLine(line:str):
+    # returns the list of Points of one wedge line "(layer,r,phi,z),(layer,r,phi,z),..."
+    tuples = line.strip()[1:-1].split("),(")
+    tuples = [tup.split(",") for tup in tuples]
+
+    return [Point(int(tupl[0]), float(tupl[1]), float(tupl[2]), float(tupl[3])) for tupl in tuples]
+
+# the brackets and commas of "(layer,r,phi,z),..." only separate numbers, so they all become spaces
+SEPARATORS = str.maketrans("(),", "   ")
+
+def parseLines(lines:list):
+    """Parses wedge lines straight into NumPy arrays without creating Points
+
+    All lines are turned into one whitespace separated buffer that NumPy converts in a
+    single call, which is much faster than splitting and converting every number in Python.
+
+    Args:
+        lines (list): wedge lines "(layer,r,phi,z),(layer,r,phi,z),..."
+
+    Returns:
+        list: one (N, 4) float array per line with columns layer, r, phi, z
+    """
+    counts = [line.count("(") for line in lines]
+    flat = np.fromstring(" ".join(lines).translate(SEPARATORS), sep=" ")
+    if len(flat) != 4*sum(counts):
+        raise Exception("Could not parse the wedge lines, every hit should be of form (layer,r,phi,z).")
+
+    return np.split(flat.reshape(-1, 4), np.cumsum(counts)[:-1])
+
+def radiiOf(wedge):
+    # sorted radii of the layers of a wedge given as a list of Points or as an (N, 4) array
+    if isinstance(wedge, np.ndarray):
+        return tuple(np.unique(wedge[:, 1]).tolist())
+    return tuple(sorted(set([point.radius for point in wedge])))
+
+def pointsOf(hits):
+    # list of Points of an (N, 4) array of layer, r, phi, z
+    return [Point(int(hit[0]), hit[1], hit[2], hit[3]) for hit in hits.tolist()]
+
+# first bytes of a binary wedge file written by convertFile
+BINARY_MAGIC = b"WEDGEBIN"
+# the magic is followed by the number of wedges, the bytes per hit value and the byte position of the index
+BINARY_HEADER = len(BINARY_MAGIC) + 3*8
+
+def convertFile(filepath, binpath:str = None, dtype = np.float64, chunk_size:int = 128):
+    """Converts a wedgeData text file to a binary file that WedgeFile can memory map
+
+    The hits of all wedges are written one after the other as rows of layer, r, phi, z,
+    followed by an index of n_wedges+1 hit offsets, so wedge k is the rows
+    offsets[k]:offsets[k+1]. Blank lines are skipped, so wedge k is the k-th wedge of the file.
+
+    Args:
+        filepath (str): path of the wedgeData text file
+        binpath (str, optional): path of the binary file, None puts it next to the text file 
+            with a .bin extension, where iterFile and readFile pick it up. Defaults to None.
+        dtype (optional): np.float64 keeps the text values exactly, np.float32 halves the size. 
+            Defaults to np.float64.
+        chunk_size (int, optional): number of wedges parsed at a time. Defaults to 128.
+
+    Returns:
+        str: path of the binary file
+    """
+    if binpath is None:
+        binpath = os.path.splitext(filepath)[0] + ".bin"
+    chunks = iterFile(filepath, stop=None, chunk_size=chunk_size, arrays=True, binary=False)
+    return writeBinary(binpath, (hits for chunk in chunks for env, hits in chunk), dtype)
+
+def writeBinary(binpath, wedges, dtype = np.float64):
+    """Writes wedges to a binary file in the format of convertFile, one at a time
+
+    Args:
+        binpath (str): path of the binary file
+        wedges (iterable): (N, 4) arrays of layer, r, phi, z, one per wedge
+        dtype (optional): np.float64 or np.float32. Defaults to np.float64.
+
+    Returns:
+        str: path of the binary file
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in [np.dtype(np.float32), np.dtype(np.float64)]:
+        raise Exception("The binary wedge format only stores float32 or float64 columns.")
+    dtype = dtype.newbyteorder("<")
+
+    offsets = [0]
+    with open(binpath, "wb") as f:
+        # header is filled in once the number of wedges is known
+        f.write(BINARY_MAGIC + np.zeros(3, dtype="<i8").tobytes())
+        for hits in wedges:
+            f.write(np.ascontiguousarray(hits, dtype=dtype).tobytes())
+            offsets.append(offsets[-1] + len(hits))
+        index_position = f.tell()
+        f.write(np.array(offsets, dtype="<i8").tobytes())
+        f.seek(len(BINARY_MAGIC))
+        f.write(np.array([len(offsets) - 1, dtype.itemsize, index_position], dtype="<i8").tobytes())
+
+    return binpath
+
+class WedgeFile:
+    # random access to the wedges of a binary file written by convertFile
+    # nothing is read up front, wedge k costs two index lookups and a slice of the memory map
+
+    def __init__(self, binpath:str):
+        with open(binpath, "rb") as f:
+            header = f.read(BINARY_HEADER)
+        if header[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+            raise Exception(f"{binpath} is not a binary wedge file, write one with convertFile.")
+        n_wedges, itemsize, index_position = np.frombuffer(header[len(BINARY_MAGIC):], dtype="<i8").tolist()
+
+        self.binpath = binpath
+        self.offsets = np.memmap(binpath, dtype="<i8", mode="r", offset=index_position, shape=(n_wedges + 1,))
+        self.hits = np.memmap(binpath, dtype=f"<f{itemsize}", mode="r", offset=BINARY_HEADER, shape=(int(self.offsets[-1]), 4))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, k:int):
+        # (N, 4) array of layer, r, phi, z of wedge k
+        if k < 0:
+            k += len(self)
+        if (k < 0) or (k >= len(self)):
+            raise IndexError(f"wedge {k} is not in {self.binpath}")
+        return self.hits[int(self.offsets[k]):int(self.offsets[k + 1])]
+
+def binaryPath(filepath):
+    # the binary file to read instead of filepath: filepath itself if it is one, or the .bin 
+    # written next to it by convertFile as long as the text file has not changed since
+    if filepath.endswith(".bin"):
+        return filepath
+    binpath = os.path.splitext(filepath)[0] + ".bin"
+    if os.path.exists(binpath) and (os.path.getmtime(binpath) >= os.path.getmtime(filepath)):
+        return binpath
+    return None
+
+def iterFile(filepath, start:int = 0, stop:int = 128, chunk_size:int = None, arrays:bool = False, binary:bool = True):
+    """Streams the wedges of a file one at a time instead of reading all of them first
+
+    Only one line of the file (or one chunk of lines) is held in memory at a time, so the 
+    first wedge can be covered while the rest of the file is still unread. Line numbers 
+    count blank lines as well, like in readFile.
+
+    If filepath is a binary file from convertFile, or one has been written next to it, the 
+    wedges start:stop are sliced out of its memory map without touching the rest of the file.
+    start and stop then count wedges, which is the same for files without blank lines.
+
+    Args:
+        filepath (str): path of the wedgeData text file
+        start (int, optional): number of lines to skip before the first wedge. Defaults to 0.
+        stop (int, optional): line number to stop at, None reads the whole file. Defaults to 128.
+        chunk_size (int, optional): if given, yields lists of up to chunk_size wedges instead of
+            single wedges. Defaults to None.
+        arrays (bool, optional): if True, the hits of each wedge are parsed with parseLines into an
+            (N, 4) array of layer, r, phi, z instead of a list of Points, one parseLines call per 
+            chunk. DataSet.importData accepts both. Defaults to False.
+        binary (bool, optional): False always parses the text file. Defaults to True.
+
+    Yields:
+        tuple: (env, pnts) with env an Environment and pnts a list of Points (or hit array), or a
+            list of such tuples if chunk_size is given
+    """
+    # one Environment per set of radii, handed out as shallow copies so that
+    # addBoundaryPoint rebinding trapezoid_edges on one wedge does not leak into the next
+    environments = {}
+
+    def toWedges(lines):
+        if wedge_file is not None:
+            hits = [hit_array if arrays else pointsOf(hit_array) for hit_array in lines]
+        elif arrays:
+            hits = parseLines(lines)
+        else:
+            hits = [parseLine(line) for line in lines]
+
+        wedges = []
+        for list_of_Points in hits:
+            radii = radiiOf(list_of_Points)
+            if radii not in environments:
+                environments[radii] = Environment(top_layer_lim= 100.0,
+                                                  beam_axis_lim = 15.0,
+                                                  num_layers=len(radii),
+                                                  radii=list(radii)
+                                                )
+            wedges.append((copy.copy(environments[radii]), list_of_Points))
+        return wedges
+
+    wedge_file = None
+    binpath = binaryPath(filepath) if binary else None
+    if binpath is not None:
+        wedge_file = WedgeFile(binpath)
+        n_wedges = len(wedge_file) if stop is None else min(stop, len(wedge_file))
+        step = 1 if chunk_size is None else int(min(chunk_size, max(n_wedges - start, 1)))
+        for k in range(start, n_wedges, step):
+            wedges = toWedges([wedge_file[i] for i in range(k, min(k + step, n_wedges))])
+            yield wedges if chunk_size is not None else wedges[0]
+        return
+
+    lines = []
+    with open(filepath) as f:
         line_index = 0
-        for line in f: 
-            if line.strip():
-                
-                tuples = line.strip()[1:-1].split("),(")
-                tuples = [tup.split(",") for tup in tuples]
-                
-                list_of_Points = [Point(int(tupl[0]), float(tupl[1]), float(tupl[2]), float(tupl[3])) for tupl in tuples]
-                radii = sorted(list(set([point.radius for point in list_of_Points])))
-                num_layers = len(radii)
-                
-                env = Environment(top_layer_lim= 100.0, 
-                                  beam_axis_lim = 15.0, 
-                                  num_layers=num_layers, 
-                                  radii=radii
-                                )
-                events.append((env, list_of_Points))
-                
-            line_index += 1 
-            if line_index == stop: 
-                break 
-    
+        for line in f:
+            if (stop is not None) and (line_index >= stop):
+                break
+            if (line_index >= start) and line.strip():
+
+                if chunk_size is None:
+                    yield toWedges([line])[0]
+                else:
+                    lines.append(line)
+                    if len(lines) == chunk_size:
+                        yield toWedges(lines)
+                        lines = []
+
+            line_index += 1
+
+    if lines:
+        yield toWedges(lines)
+
+def readFile(filepath, stop:int = 128, performance:bool=False, arrays:bool=False, binary:bool=True):
+    # returns a list of wedges
+    # Each wedge is represented by tuple (env, pnts)
+    # env is an Environment, and pnts is a list of Points
+    # with arrays=True, pnts is an (N, 4) array of layer, r, phi, z and the whole file is 
+    # parsed by a single parseLines call
+    # filepath may also be a binary file from convertFile, see iterFile, binary=False ignores them
+    # use iterFile to go through the wedges without holding all of them in memory
+
+    start = time.time()
+
+    # Create a list of events, with each event consisting of an environment and its list of Points
+    events = []
+    chunk_size = 1
+    if arrays:
+        # everything up to stop goes into a single chunk
+        chunk_size = stop if stop is not None else float("inf")
+    for chunk in iterFile(filepath, stop=stop, chunk_size=chunk_size, arrays=arrays, binary=binary):
+        events.extend(chunk)
+
     if performance == True:
         print(f"Time Taken to Read File : {time.time() - start}s")
-        
-    return events 
 
+    return events
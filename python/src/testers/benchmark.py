@@ -0,0 +1,282 @@
+from src.coverers.data_structs import *
+from src.readers.reader import *
+from src.readers.generator import writeWedges
+from src.coverers.wedgecover import wedgeCover, pointRepetitionFactors, linesAcceptedByPatches
+from src.coverers.parallelogram import acceptanceOfPatches
+from src.coverers.line import LineGenerator
+import numpy as np
+import contextlib
+import tempfile
+import json
+import time
+import io
+import os
+
+SOLVE_LININGS = ['makePatches_Projective_Leftright', 'makePatches_Projective_center', 'makePatches_Projective_quartile',
+                 'makePatches_ShadowQuilt_fromEdges', 'makePatches_ShadowQuilt_fromCenter']
+
+def reader_benchmark(v = 'v3', stop = 128, repeat = 3, check = True):
+    """Times the Point based reader against the vectorized parseLines reader and the memory
+    mapped binary format of convertFile, reading the file and importing every wedge into a DataSet
+
+    Args:
+        v (str, optional): version of data, ensure data file is in directory as "wedgeData_{v}_128.txt"
+        stop (int, optional): number of lines of the file to read. Defaults to 128.
+        repeat (int, optional): number of timed reads per reader, the fastest one is kept. Defaults to 3.
+        check (bool, optional): True to check that both readers give the same hits. Defaults to True.
+
+    Returns:
+        dict: best time in seconds of each reader and the speedups over the Point reader
+    """
+    filepath = f'python/data/wedgeData_{v}_128.txt'
+
+    binpath = os.path.join(tempfile.mkdtemp(), 'wedgeData.bin')
+    convertFile(filepath, binpath)
+
+    timings = {}
+    for name, path, arrays, binary in [('points', filepath, False, False), ('arrays', filepath, True, False), ('binary', binpath, True, True)]:
+        best = np.inf
+        for _ in range(repeat):
+            start = time.time()
+            events = readFile(path, stop=stop, arrays=arrays, binary=binary)
+            for env, points in events:
+                DataSet(env).importData(points)
+            best = min(best, time.time() - start)
+        timings[name] = best
+
+    if check == True:
+        point_events = readFile(filepath, stop=stop, binary=False)
+        for other_events in [readFile(filepath, stop=stop, arrays=True, binary=False), readFile(binpath, stop=stop, arrays=True)]:
+            if len(point_events) != len(other_events):
+                raise Exception("The readers found a different number of wedges.")
+            for (point_env, points), (array_env, hits) in zip(point_events, other_events):
+                expected = np.array([[point.layer_num, point.radius, point.phi, point.z] for point in points])
+                if (point_env.radii != array_env.radii) or (not np.array_equal(expected, hits)):
+                    raise Exception("The readers do not give the same hits.")
+    os.remove(binpath)
+
+    timings['speedup'] = timings['points']/timings['arrays']
+    timings['binary_speedup'] = timings['points']/timings['binary']
+    print(f"Read {len(events)} wedges: Points {timings['points']:.4f}s, arrays {timings['arrays']:.4f}s ({timings['speedup']:.1f}x), binary {timings['binary']:.4f}s ({timings['binary_speedup']:.1f}x)")
+
+    return timings
+
+def best_time(function, repeat = 3):
+    # fastest of repeat calls of function, with the printout of the solvers swallowed, and the result of the last call
+    best = np.inf
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function()
+            best = min(best, time.perf_counter() - start)
+    return best, result
+
+def import_wedges(events, top_layer_cutoff = 50., z0_luminousRegion = 15.):
+    # DataSet of every wedge with the 1 micron boundary points, on a new Environment per wedge like wedge_test_cover,
+    # since addBoundaryPoint moves the trapezoid edges of the Environment it is given
+    datasets = []
+    for _, hits in events:
+        env = Environment(top_layer_lim = top_layer_cutoff, beam_axis_lim = z0_luminousRegion)
+        data = DataSet(env)
+        data.importData(hits)
+        data.addBoundaryPoint()
+        datasets.append((env, data))
+    return datasets
+
+# errors the solver is known to raise on some wedges (IndexError of makePatches_ShadowQuilt_fromEdges), 
+# reported per wedge instead of stopping the benchmark
+KNOWN_SOLVE_ERRORS = (IndexError,)
+
+def solve_wedges(datasets, lining, apexZ0 = 0, ppl = 16):
+    # wedgeCover of every wedge, solved with one lining, None for the wedges with a KNOWN_SOLVE_ERRORS, 
+    # and the index and error of each of those wedges. Any other error is raised.
+    covers, failures = [], []
+    for k, (env, data) in enumerate(datasets):
+        cover = wedgeCover(env, data)
+        try:
+            cover.solve(apexZ0 = apexZ0, lining = lining, ppl = ppl, show = False)
+        except KNOWN_SOLVE_ERRORS as error:
+            cover = None
+            failures.append({'wedge': k, 'error': type(error).__name__})
+        covers.append(cover)
+    return covers, failures
+
+def cover_counts(covers, failures):
+    # number of patches of the solved wedges and the wedges the solver failed on
+    return {'patches': sum(cover.n_patches for cover in covers if cover is not None), 'failed': failures}
+
+def cover_benchmark(filepath, stop = 16, linings = SOLVE_LININGS, ppl = 16, apexZ0 = 0, z0_spacing = 0.5, lines = 1000, repeat = 3, 
+                    top_layer_cutoff = 50., z0_luminousRegion = 15., check = True):
+    """Times every stage of covering the wedges of one file: reading, importing, solving with every lining,
+    the PRF of every point and the Analytic and MonteCarlo acceptance of the covers of the first lining
+
+    Args:
+        filepath (str): wedge file, text or binary
+        stop (int, optional): number of wedges to read. Defaults to 16.
+        linings (list, optional): solve methods to time. Defaults to SOLVE_LININGS.
+        ppl (int, optional): points per layer in each superpoint. Defaults to 16.
+        apexZ0 (int, optional): z0 of the patch apexes. Defaults to 0.
+        z0_spacing (float, optional): spacing of the z0 the acceptance is found for. Defaults to 0.5.
+        lines (int, optional): number of lines per z0 of the MonteCarlo acceptance. Defaults to 1000.
+        repeat (int, optional): number of timed runs per stage, the fastest one is kept. Defaults to 3.
+        top_layer_cutoff (float, optional): top layer limit of the Environment of every wedge. Defaults to 50.
+        z0_luminousRegion (float, optional): beam axis limit of the Environment of every wedge. Defaults to 15.
+        check (bool, optional): True to check that importing the wedges twice gives the same trapezoid edges 
+            and boundary points. Defaults to True.
+
+    Returns:
+        dict: 'timings' in seconds and 'counts' of patches, points and mean acceptance of every stage
+    """
+    binary = os.path.splitext(filepath)[1] == '.bin'
+    timings, counts = {}, {}
+    timings['read'], events = best_time(lambda: readFile(filepath, stop=stop, arrays=True, binary=binary), repeat)
+    timings['import'], _ = best_time(lambda: import_wedges(events, top_layer_cutoff, z0_luminousRegion), repeat)
+    # the stages below get their own import, so they see the same wedges whatever repeat is
+    datasets = import_wedges(events, top_layer_cutoff, z0_luminousRegion)
+    if check == True:
+        for (env, data), (other_env, other_data) in zip(datasets, import_wedges(events, top_layer_cutoff, z0_luminousRegion)):
+            if (not np.array_equal(env.trapezoid_edges, other_env.trapezoid_edges)) or \
+               any((z[0], z[-1]) != (other_z[0], other_z[-1]) for z, other_z in zip(data.z, other_data.z)):
+                raise Exception("Importing the wedges again moved the trapezoid edges or the boundary points.")
+    counts['wedges'] = len(events)
+    counts['points'] = int(sum(len(hits) for env, hits in events))
+
+    covers = {}
+    for lining in linings:
+        timings[f'solve/{lining}'], (covers[lining], failures) = best_time(lambda: solve_wedges(datasets, lining, apexZ0, ppl), repeat)
+        lining_counts = cover_counts(covers[lining], failures)
+        counts[f'patches/{lining}'] = lining_counts['patches']
+        counts[f'failed/{lining}'] = lining_counts['failed']
+
+    # the PRF and acceptance are measured on the wedges the first lining solved
+    solved = [(data, cover) for (env, data), cover in zip(datasets, covers[linings[0]]) if cover is not None]
+    first_covers = [cover for data, cover in solved]
+    timings['PRF'], _ = best_time(lambda: [pointRepetitionFactors(data, cover.superpoint_bounds()) for data, cover in solved], repeat)
+
+    env = datasets[0][0]
+    z0Array = np.arange(-env.beam_axis_lim, env.beam_axis_lim+z0_spacing, z0_spacing)
+    def analytic():
+        return [acceptanceOfPatches(env, cover.superpoint_bounds(), z0Array)[0] for cover in first_covers]
+    def monte_carlo():
+        acceptance = []
+        for cover in first_covers:
+            superpoint_bounds = cover.superpoint_bounds()
+            for z0 in z0Array:
+                test_lines, _ = LineGenerator(env, z0).generateEvenGrid(lines, arrays=True)
+                contained, _ = linesAcceptedByPatches(test_lines[:, 1:], superpoint_bounds)
+                acceptance.append(100.0*np.count_nonzero(contained)/lines)
+        return acceptance
+    timings['acceptance/Analytic'], acceptance = best_time(analytic, repeat)
+    counts['acceptance/Analytic'] = float(np.mean(acceptance))
+    # numba compiles the acceptance kernel on the first call, repeat > 1 keeps that out of the best time
+    timings['acceptance/MonteCarlo'], acceptance = best_time(monte_carlo, repeat)
+    counts['acceptance/MonteCarlo'] = float(np.mean(acceptance))
+
+    return {'timings': timings, 'counts': counts}
+
+def benchmark_suite(v = 'v3', wedges = 16, seed = 0, lining = 'makePatches_ShadowQuilt_fromEdges', ppls = [16, 32], densities = [0.5, 1., 2.], 
+                    repeat = 3, output = None, baseline = None, tolerance = 0.2, top_layer_cutoff = 50., z0_luminousRegion = 15.):
+    """Benchmarks the reader, the patch builders and the acceptance on fixed synthetic wedges and, if the data file
+    is there, on the recorded wedges, then scales the solve time over ppl and hit density
+
+    The synthetic wedges come from writeWedges with a fixed seed, so runs of different versions time the same hits.
+
+    Args:
+        v (str, optional): version of data, the recorded wedges are read from "python/data/wedgeData_{v}_128.txt"
+            and skipped if it is not there. Defaults to 'v3'.
+        wedges (int, optional): number of wedges of each benchmark. Defaults to 16.
+        seed (int, optional): seed of the synthetic wedges. Defaults to 0.
+        lining (str, optional): solve method of the ppl and density scans. Defaults to 'makePatches_ShadowQuilt_fromEdges'.
+        ppls (list, optional): points per layer of the ppl scan, the solvers take 16 or 32. Defaults to [16, 32].
+        densities (list, optional): factors on the default number of tracks and noise hits of the density scan. 
+            Defaults to [0.5, 1., 2.].
+        repeat (int, optional): number of timed runs per stage, the fastest one is kept. Defaults to 3.
+        output (str, optional): JSON file the results are written to, none if None. Defaults to None.
+        baseline (str or dict, optional): earlier results, regressions against it are printed. Defaults to None.
+        tolerance (float, optional): relative slowdown that counts as a regression. Defaults to 0.2.
+        top_layer_cutoff (float, optional): top layer limit of the wedges, as in wedge_test. Defaults to 50.
+        z0_luminousRegion (float, optional): beam axis limit of the wedges, as in wedge_test. Defaults to 15.
+
+    Returns:
+        dict: results of every benchmark, with the time and settings of the run
+    """
+    directory = tempfile.mkdtemp()
+    results = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'settings': {'wedges': wedges, 'seed': seed, 'lining': lining, 'repeat': repeat, 
+               'top_layer_cutoff': top_layer_cutoff, 'z0_luminousRegion': z0_luminousRegion}}
+    env = Environment(top_layer_lim = top_layer_cutoff, beam_axis_lim = z0_luminousRegion)
+
+    synthetic = writeWedges(os.path.join(directory, 'synthetic.txt'), wedges, seed=seed, binary=False, env=env)
+    results['synthetic'] = cover_benchmark(synthetic, stop=wedges, repeat=repeat, top_layer_cutoff=top_layer_cutoff, z0_luminousRegion=z0_luminousRegion)
+    os.remove(synthetic)
+
+    recorded = f'python/data/wedgeData_{v}_128.txt'
+    if os.path.exists(recorded):
+        results['recorded'] = cover_benchmark(recorded, stop=wedges, repeat=repeat, top_layer_cutoff=top_layer_cutoff, z0_luminousRegion=z0_luminousRegion)
+
+    # solve time of the same synthetic wedges for every ppl
+    path = writeWedges(os.path.join(directory, 'ppl.bin'), wedges, seed=seed, env=env)
+    datasets = import_wedges(readFile(path, stop=wedges, arrays=True), top_layer_cutoff, z0_luminousRegion)
+    os.remove(path)
+    results['ppl'] = {}
+    for ppl in ppls:
+        seconds, (covers, failures) = best_time(lambda: solve_wedges(datasets, lining, ppl=ppl), repeat)
+        results['ppl'][str(ppl)] = {'seconds': seconds, **cover_counts(covers, failures)}
+
+    # solve time for more or fewer tracks and noise hits per wedge
+    results['density'] = {}
+    for density in densities:
+        path = writeWedges(os.path.join(directory, 'density.bin'), wedges, seed=seed, env=env, tracks=150.*density, noise=15.*density)
+        events = readFile(path, stop=wedges, arrays=True)
+        os.remove(path)
+        datasets = import_wedges(events, top_layer_cutoff, z0_luminousRegion)
+        seconds, (covers, failures) = best_time(lambda: solve_wedges(datasets, lining), repeat)
+        results['density'][str(density)] = {'seconds': seconds, 'points': int(sum(len(hits) for env, hits in events)), **cover_counts(covers, failures)}
+    os.rmdir(directory)
+
+    for name, seconds in flatten_timings(results).items():
+        print(f"{name:<60} {seconds:.4f}s")
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if baseline is not None:
+        compare_benchmarks(baseline, results, tolerance)
+
+    return results
+
+def flatten_timings(results):
+    # every time in seconds of benchmark_suite results, keyed by its path like "synthetic/solve/makePatches_Projective_center"
+    timings = {}
+    for benchmark in ['synthetic', 'recorded']:
+        for stage, seconds in results.get(benchmark, {}).get('timings', {}).items():
+            timings[f'{benchmark}/{stage}'] = seconds
+    for scan in ['ppl', 'density']:
+        for value, result in results.get(scan, {}).items():
+            timings[f'{scan}/{value}'] = result['seconds']
+    return timings
+
+def compare_benchmarks(baseline, results, tolerance = 0.2):
+    """Compares the timings of two benchmark_suite runs and prints the stages that got slower
+
+    Args:
+        baseline (str or dict): results of the earlier version or the JSON file they were written to
+        results (str or dict): results of the new version or the JSON file they were written to
+        tolerance (float, optional): relative slowdown that counts as a regression. Defaults to 0.2.
+
+    Returns:
+        dict: (baseline seconds, new seconds) of every stage that is more than tolerance slower
+    """
+    if isinstance(baseline, str):
+        with open(baseline) as f:
+            baseline = json.load(f)
+    if isinstance(results, str):
+        with open(results) as f:
+            results = json.load(f)
+
+    old, new = flatten_timings(baseline), flatten_timings(results)
+    regressions = {name: (old[name], new[name]) for name in old.keys() & new.keys() if new[name] > (1 + tolerance)*old[name]}
+    for name, (old_seconds, new_seconds) in sorted(regressions.items()):
+        print(f"Regression {name}: {old_seconds:.4f}s -> {new_seconds:.4f}s ({new_seconds/old_seconds:.2f}x)")
+    if len(regressions) == 0:
+        print(f"No stage is more than {100*tolerance:.0f}% slower than the baseline.")
+
+    return regressions
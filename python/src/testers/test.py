@@ -8,12 +8,108 @@ from src.coverers.data_structs import *
 from src.coverers.line import * 
 from src.readers.reader import *
 from src.coverers.wedgecover import *
+from src.coverers.covercache import *
+from src.readers.generator import generateWedges
 from src.debug import * 
 import numpy as np 
 import matplotlib.pyplot as plt 
 import time
+import io
+import contextlib
+import collections
+import functools
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
 
-def wedge_test(lining:str = "makePatches_Projective_center", apexZ0 = 0, z0_spacing = 0.5, ppl = 16, z0_luminousRegion = 15., wedges = [0, 128], lines=1000, v = 'v3', top_layer_cutoff = 50., accept_cutoff = 10., leftRightAlign=True, uniform_N_points = False, acceptance_method = "Analytic", show_acceptance_of_cover=False, movie = False, savefig=False, figSizeScale=6, movieFigSizeScale=3):
+def wedge_test_cover(k, points, lining, apexZ0, ppl, z0_luminousRegion, top_layer_cutoff, z0Array, uniform_N_points = False, leftRightAlign = True, acceptance_method = "Analytic", lines = 1000, keep_cover = False, stats = False):
+    """Covers one wedge for wedge_test and measures it, without plotting so that it can run in a worker process
+
+    Returns:
+        dict: number of real and of all patches, PRF of every point, acceptance (%) for every z0, last 
+            merged segment of the union for every z0 (Analytic only), the cover if keep_cover and the 
+            coverStats of the wedge if stats
+    """
+    print('wedge: ', k)
+    wedge_stats = coverStats() if stats else None
+    stage = wedge_stats.stage if stats else (lambda name: contextlib.nullcontext())
+    #convert to existing data format
+    with stage('import'):
+        env = Environment(top_layer_lim = top_layer_cutoff, beam_axis_lim=z0_luminousRegion)
+        data = DataSet(env)
+        if uniform_N_points == False:
+            data.importData(points)
+        else:
+            data.generateUniform([uniform_N_points, uniform_N_points, uniform_N_points, uniform_N_points, uniform_N_points])
+        #add the 1 micron boundary points
+        data.addBoundaryPoint()
+    #solve for cover, timed by the cover itself
+    cover = wedgeCover(env, data, wedge_stats)
+    cover.solve(apexZ0 = apexZ0, lining=lining, ppl = ppl, leftRight=leftRightAlign, show = False)
+    #PRF of every point
+    with stage('PRF'):
+        out = np.concatenate(pointRepetitionFactors(data, cover.superpoint_bounds())).tolist()
+
+    with stage('acceptance'):
+        acceptance, last_segments = wedge_acceptance(env, cover, z0Array, acceptance_method, lines)
+
+    # n_all_patches counts every patch the solver tried, also the candidates it dropped without adding them
+    return {'n_patches': cover.n_patches, 'n_all_patches': len(cover.all_patches) + cover.n_discarded_patches, 'PRF': out, 
+            'acceptance': acceptance, 'last_segments': last_segments, 'cover': cover if keep_cover else None, 'stats': wedge_stats}
+
+def wedge_acceptance(env, cover, z0Array, acceptance_method = "Analytic", lines = 1000):
+    # acceptance (%) of a cover for every z0 and, for Analytic, the last merged segment of the union for every z0
+    last_segments = None
+    if acceptance_method == "Analytic": 
+        # cast shadows from every z0 to layer5 of each superpoint and take the union over patches, all z0 at once
+        acceptance, last_segments = acceptanceOfPatches(env, cover.superpoint_bounds(), z0Array)
+
+    elif acceptance_method == "MonteCarlo": 
+        acceptance = np.zeros(len(z0Array))
+        superpoint_bounds = cover.superpoint_bounds()
+        for iz, z0 in enumerate(np.array(z0Array)):
+            lg = LineGenerator(env, z0)
+            test_lines, _ = lg.generateEvenGrid(lines, arrays=True)
+            accepted, _ = linesAcceptedByPatches(test_lines[:, 1:], superpoint_bounds)
+            
+            acceptance[iz] = 100.0*np.count_nonzero(accepted)/lines
+
+    return acceptance, last_segments
+
+def timed_iter(iterable, stats:coverStats, name:str):
+    # yields the items of iterable, adding the time spent producing each of them to the stage name of stats
+    iterator = iter(iterable)
+    while True:
+        with stats.stage(name):
+            item = next(iterator, StopIteration)
+        if item is StopIteration:
+            return
+        yield item
+
+def print_captured(function, *args):
+    # runs function in a worker process and hands its printout back to be printed in order
+    with contextlib.redirect_stdout(io.StringIO()) as printout:
+        result = function(*args)
+    return result, printout.getvalue()
+
+def parallel_map(function, iterable, workers:int):
+    # like map(function, *args) for args in iterable, but on a pool of worker processes
+    # results come back in the order of iterable, with the printout of each call printed just before it,
+    # and at most 2*workers arguments are in flight so long wedge ranges are streamed
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for args in iterable:
+            pending.append(executor.submit(print_captured, function, *args))
+            if len(pending) >= 2*workers:
+                result, printout = pending.popleft().result()
+                print(printout, end='')
+                yield result
+        while pending:
+            result, printout = pending.popleft().result()
+            print(printout, end='')
+            yield result
+
+def wedge_test(lining:str = "makePatches_Projective_center", apexZ0 = 0, z0_spacing = 0.5, ppl = 16, z0_luminousRegion = 15., wedges = [0, 128], lines=1000, v = 'v3', top_layer_cutoff = 50., accept_cutoff = 10., leftRightAlign=True, uniform_N_points = False, acceptance_method = "Analytic", show_acceptance_of_cover=False, movie = False, savefig=False, figSizeScale=6, movieFigSizeScale=3, workers=1, stats=False):
     """Creates acceptance vs z0 plot
     
     Args:
@@ -27,6 +123,9 @@ def wedge_test(lining:str = "makePatches_Projective_center", apexZ0 = 0, z0_spac
         uniform_N_points(False or int): number of points in each layer or False to be not uniform
         v (str, optional): version of data, ensure data file is in directory as "wedgeData_{v}_128.txt"
         acceptance_method : choose between 'Analytic' or 'MonteCarlo'
+        workers (int, optional): number of processes covering wedges in parallel, results are the same as with 1
+        stats (bool, optional): True to count and time every stage of every wedge, the coverStats of the run 
+            are printed and returned
     """
 
     accept_cutoff = z0_luminousRegion    
@@ -50,54 +149,44 @@ def wedge_test(lining:str = "makePatches_Projective_center", apexZ0 = 0, z0_spac
     mean_list = np.zeros(( wedges[1]-wedges[0], len(z0Array)))
     z0Imperfect = []
     z0OverEfficiency = []
-    #read wedgeData file and create environment
-    all_data = readFile(f'python/data/wedgeData_{v}_128.txt', wedges[1])
-    #loop through all events
-    for ik, k in enumerate(np.arange(wedges[0], wedges[1])):
-        print('wedge: ', k)
-        #convert to existing data format
-        env, points = all_data[k] 
-        env = Environment(top_layer_lim = top_layer_cutoff, beam_axis_lim=z0_luminousRegion)
-        data = DataSet(env)
+    #stream wedgeData file one wedge at a time, cover it and measure it, in worker processes if workers > 1
+    keep_cover = show_acceptance_of_cover or movie
+    run_stats = coverStats() if stats else None
+    wedge_events = iterFile(f'python/data/wedgeData_{v}_128.txt', start=wedges[0], stop=wedges[1], arrays=True)
+    if stats:
+        wedge_events = timed_iter(wedge_events, run_stats, 'read')
+    wedge_args = ((wedges[0] + ik, points) for ik, (env, points) in enumerate(wedge_events))
+    cover_wedge = functools.partial(wedge_test_cover, lining=lining, apexZ0=apexZ0, ppl=ppl, z0_luminousRegion=z0_luminousRegion, 
+                                    top_layer_cutoff=top_layer_cutoff, z0Array=z0Array, uniform_N_points=uniform_N_points, 
+                                    leftRightAlign=leftRightAlign, acceptance_method=acceptance_method, lines=lines, keep_cover=keep_cover, stats=stats)
+    if workers > 1:
+        results = parallel_map(cover_wedge, wedge_args, workers)
+    else:
+        results = (cover_wedge(k, points) for k, points in wedge_args)
+
+    #loop through all events, in wedge order, plotting only happens here
+    for ik, result in enumerate(results):
+        k = wedges[0] + ik
+        num_covers.append(result['n_patches'])
+        num_all_patches.append(result['n_all_patches'])
+        if stats:
+            run_stats += result['stats']
+        out = result['PRF']
+        PRF.append(out)
+        cover = result['cover']
+        env = cover.env if keep_cover else None
+
         if show_acceptance_of_cover:
             plt.figure(figsize = (1.7*z0_luminousRegion/figSizeScale, top_layer_cutoff/figSizeScale))
-        if uniform_N_points == False:
-            data.importData(points)
-        else:
-            data.generateUniform([uniform_N_points, uniform_N_points, uniform_N_points, uniform_N_points, uniform_N_points])
-        #add the 1 micron boundary points
-        data.addBoundaryPoint()
-        #solve for cover
-        cover = wedgeCover(env, data)
-        cover.solve(apexZ0 = apexZ0, lining=lining, ppl = ppl, leftRight=leftRightAlign, show = False)
-        #append number of covers in the patch
-        num_covers.append(cover.n_patches)
-        num_all_patches.append(len(cover.all_patches))
-        out = [] 
 
-        #these loops calculate PRF
-        for layer in range(env.num_layers): 
-            for point in data.array[layer]: 
+            #this loop shows quilt of patches  
+            for iz, zIn in enumerate(np.array(zInnerLayer)):
                 
-                num_in = 0
+                list_of_intersections = []
                 for patch in cover.patches: 
-                    if patch.contains_p(point, layer): 
-                        num_in += 1
-                        
-                out.append(num_in)
-        PRF.append(out)
-        sleep_time_between_patches = 0.0
-        
-        #this loop shows quilt of patches  
-        for iz, zIn in enumerate(np.array(zInnerLayer)):
-            
-            list_of_intersections = []
-            for patch in cover.patches: 
-                list_of_segs = [pgram.crossSection(zIn) for pgram in patch.parallelograms]
-                overlap_of_superpoints = intersection(patch.env, list_of_segs, True) 
-                list_of_intersections.append(overlap_of_superpoints)
-                
-            if show_acceptance_of_cover:
+                    list_of_segs = [pgram.crossSection(zIn) for pgram in patch.parallelograms]
+                    overlap_of_superpoints = intersection(patch.env, list_of_segs, True) 
+                    list_of_intersections.append(overlap_of_superpoints)
                     
                 plt.xlabel(r"$z_1$ (cm)", fontsize = 18)
                 plt.ylabel(r"$z_{top}$ (cm)", fontsize = 18)
@@ -117,34 +206,16 @@ def wedge_test(lining:str = "makePatches_Projective_center", apexZ0 = 0, z0_spac
                     col += 1
                     time.sleep(0)
 
-        #these loops calculate acceptance vs z0
+        #these loops go through the acceptance vs z0
         for iz, z0 in enumerate(np.array(z0Array)):
             
+            percentage_accepted = result['acceptance'][iz]
             if acceptance_method == "Analytic": 
                 
-                list_of_z0intersections = []
-                list_of_z0intersectionsCopy = []
-                for patch in cover.patches: 
-                    # convert to a z0 scan when parameter space is (z1,z5), cast shadow from z0 to layer5 of each superpoint 
-                    list_of_segs_z0Scan = [
-                        lineSegment(
-                            min(patch.env.top_layer_lim,max(-patch.env.top_layer_lim,
-                                patch.straightLineProjectorFromLayerIJtoK(z0,SuPoint.min,0,spLayer+1,patch.env.num_layers))),
-                            max(-patch.env.top_layer_lim,min(patch.env.top_layer_lim,
-                                patch.straightLineProjectorFromLayerIJtoK(z0,SuPoint.max,0,spLayer+1,patch.env.num_layers))),
-                        ) for spLayer, SuPoint in enumerate(patch.superpoints)]
-                    overlap_of_superpoints_z0Scan = intersection(patch.env, list_of_segs_z0Scan, False) 
-                    list_of_z0intersections.append(overlap_of_superpoints_z0Scan)
-
-                list_of_z0intersectionsCopy = list_of_z0intersections
-                total_measure = unionOfLineSegments(list_of_z0intersections)
-                #print('total_measure:',total_measure)
-                percentage_accepted = 100.0*total_measure/(2.0 * patch.env.top_layer_lim)
                 if (percentage_accepted < 99.0) and (abs(z0) < z0_luminousRegion):
                     print('wedge: ', k, ' underEfficiency percentage_accepted: ', percentage_accepted, ' z0:', z0)
                     z0Imperfect.append(z0)
-                    for seg in list_of_z0intersectionsCopy:
-                        print('segment:',seg.min_z5_accepted, seg.max_z5_accepted)
+                    print('segment:',result['last_segments'][iz, 0], result['last_segments'][iz, 1])
                     #for patch in cover.patches:
                         #if (overlap_of_superpoints_z0Scan.min_z5_accepted < overlap_of_superpoints_z0Scan.max_z5_accepted):
                             #print('overlap_of_superpoints_z0Scan:',overlap_of_superpoints_z0Scan.min_z5_accepted,overlap_of_superpoints_z0Scan.max_z5_accepted)
@@ -164,20 +235,6 @@ def wedge_test(lining:str = "makePatches_Projective_center", apexZ0 = 0, z0_spac
                         z1Right = cover.patches[-1].straightLineProjectorFromLayerIJtoK(top_layer_cutoff,zOverEff,env.num_layers,0,1)
                         z1Val = [z1Left,z1Right]
                         plt.plot(z1Val, zTopVal, linewidth=0.01, color='lightskyblue', alpha=0.2)
-                    
-            elif acceptance_method == "MonteCarlo": 
-                percentage_accepted = 0 
-                
-                lg = LineGenerator(env, z)
-                test_lines = lg.generateEvenGrid(lines)
-                
-                for i in range(len(test_lines)): 
-                    for patch in cover.patches:
-                        if patch.contains(test_lines[i]):
-                            percentage_accepted += 1 
-                            break
-                
-                percentage_accepted = 100.0*percentage_accepted/lines
             
             mean_list[ik, iz] = mean_list[ik, iz] + percentage_accepted
 
@@ -247,12 +304,14 @@ def wedge_test(lining:str = "makePatches_Projective_center", apexZ0 = 0, z0_spac
     plt.show()  
 
     #cover.plot()
+    if stats:
+        run_stats.report()
+        return run_stats
 
 def unaccepted_lines(apexZ0:list = [-10, 0, 10], wedge_number = 0, line_origin:list = [-5, 5], accepted = False, unaccepted = True, v = 'v3', top_layer_cutoff = 100., uniform_points = False): 
     filepath = f"python/data/wedgeData_{v}_128.txt"
     f = open(f'python/data/{v}_patches.txt')
-    filedata = readFile(filepath, stop=128, performance=False)
-    env, points = filedata[wedge_number]
+    env, points = next(iterFile(filepath, start=wedge_number, stop=wedge_number+1, arrays=True))
     env = Environment(top_layer_lim = top_layer_cutoff)
     ds = DataSet(env)
     datastring = f"Wedge {wedge_number} Event {v}"
@@ -266,10 +325,17 @@ def unaccepted_lines(apexZ0:list = [-10, 0, 10], wedge_number = 0, line_origin:l
     colors = ['b', 'orange', 'm', 'c', 'k']
     plt.figure(figsize = (10, 8))
     lines_to_plot = []
-    fitting_lines = []
+    #z of the lines on the layers, their origins and slopes, Lines are only made for plotting
+    fitting_points = []
+    fitting_origins = []
+    fitting_slopes = []
     for z in line_origin:
         lGen = LineGenerator(env, z)
-        fitting_lines = fitting_lines + lGen.generateEvenGrid(100)
+        points, slopes = lGen.generateEvenGrid(100, arrays=True)
+        fitting_points.append(points[:, 1:])
+        fitting_origins += [z]*len(slopes)
+        fitting_slopes += slopes.tolist()
+    fitting_points = np.concatenate(fitting_points)
     for i in range(len(apexZ0)):
         cov = wedgeCover(env, ds)
         cov.makePatches_Projective_center(apexZ0 = apexZ0[i])
@@ -280,12 +346,13 @@ def unaccepted_lines(apexZ0:list = [-10, 0, 10], wedge_number = 0, line_origin:l
             to_plot_l = []
             to_plot_r = []
             for layer in range(cov.env.num_layers):
-                to_plot_l.append(min(patch.superpoints[layer].z_values))
-                to_plot_r.append(max(patch.superpoints[layer].z_values))
-                left = min(patch.superpoints[layer].z_values)
-                right = max(patch.superpoints[layer].z_values)   
-                lambdaZ_list_left.append((left - apexZ0[i])/env.radii[layer])
-                lambdaZ_list_right.append((right - apexZ0[i])/env.radii[layer])
+                sp = patch.superpoints[layer]
+                to_plot_l.append(sp.min)
+                to_plot_r.append(sp.max)
+                #lambdaZ of the lowest and highest hit, from the lambdaZ index shared by all patches of apexZ0[i]
+                lambdaZ_values = ds.lambdaZ(layer, apexZ0[i])[sp.start:sp.stop]
+                lambdaZ_list_left.append(lambdaZ_values[0])
+                lambdaZ_list_right.append(lambdaZ_values[-1])
             min_lambdaZ = np.max(lambdaZ_list_left)
             max_lambdaZ = np.min(lambdaZ_list_right)
             to_plot_r.reverse()
@@ -301,19 +368,18 @@ def unaccepted_lines(apexZ0:list = [-10, 0, 10], wedge_number = 0, line_origin:l
             plt.fill(to_plot_l + to_plot_r, new_radiis, color = colors[i], alpha = 0.2)
             #plt.plot([apexZ0[i],min_lambdaZ*top+apexZ0[i], max_lambdaZ*top+apexZ0[i], apexZ0[i]], [0, top, top, 0], color = colors[i], label = label, alpha = 0.5)
             #plt.fill_between([apexZ0[i],min_lambdaZ*top+apexZ0[i], max_lambdaZ*top+apexZ0[i], apexZ0[i]], [0, top, top, 0], color = colors[i], alpha = 0.2)
-            for line_index, line in enumerate(fitting_lines):
-                if patch.contains(line) == True:
-                    lines_to_plot.append(line_index)
+            contained, _ = linesAcceptedByPatches(fitting_points, np.array([[[sp.min, sp.max] for sp in patch.superpoints]]))
+            lines_to_plot.extend(np.flatnonzero(contained).tolist())
     lines_to_plot = np.unique(lines_to_plot)
-    for l, line in enumerate(fitting_lines):
+    for l, (origin, slope) in enumerate(zip(fitting_origins, fitting_slopes)):
         if l in lines_to_plot:
             if accepted == True:
-                line.plot('g')
+                Line(env, origin, slope).plot('g')
             else:
                 pass
         else:
             if unaccepted == True:
-                line.plot('r')
+                Line(env, origin, slope).plot('r')
             else:
                 pass
     if accepted == True:
@@ -328,7 +394,26 @@ def unaccepted_lines(apexZ0:list = [-10, 0, 10], wedge_number = 0, line_origin:l
     plt.title(datastring, fontsize = 24)
     plt.show()
 
-def minimal_cover_binary_search(lining:str = "makePatches_Projective_center", accept = 0.999, start = 'odd', ppl = 16, wedges = 128, z_top = 50., z0_spacing = 0.5, z0_luminousRegion = 15., v = 'v3', savefig = False):
+def parallelogramSegments(cover, z0Array):
+    # for every z0, the (patches, 2) min and max of the top layer segment accepted by each patch of the cover, the 
+    # intersection of the cross sections of its parallelograms_v1 that minimal_cover_binary_search measures
+    segments = []
+    for z in np.array(z0Array):
+        list_of_intersections = []
+        for patch in cover.patches: 
+            overlap_of_superpoints = intersection(patch.env, [pgram.crossSection(z) for pgram in patch.parallelograms_v1], True)
+            list_of_intersections.append((overlap_of_superpoints.min_z5_accepted, overlap_of_superpoints.max_z5_accepted))
+        segments.append(np.array(list_of_intersections, dtype=float).reshape(-1, 2))
+    return segments
+
+def minimal_cover_binary_search(lining:str = "makePatches_Projective_center", accept = 0.999, start = 'odd', ppl = 16, wedges = 128, z_top = 50., z0_spacing = 0.5, z0_luminousRegion = 15., v = 'v3', savefig = False, cache = None, incremental = False):
+    # covers already solved in an earlier iteration are taken from cache, a CoverCache that can be shared between calls
+    # incremental covers each apexZ0 on its own once per wedge and keeps the segments it accepts for every z0, an iteration
+    # only merges them into the union over real_solve instead of solving and measuring the whole apexZ0 array again.
+    # The covers of separate apexZ0 are not checked for repeated patches like one cover of the whole array, so the
+    # numbers of patches, PRF and acceptance can differ from incremental = False
+    if cache is None:
+        cache = CoverCache()
     if start == 'odd':
         apexZ0 = [0]
         real_solve = [0]
@@ -350,35 +435,47 @@ def minimal_cover_binary_search(lining:str = "makePatches_Projective_center", ac
     data_string = f"{v} events"
     left_stop = False
     right_stop = False
+    #per wedge, the number of patches, superpoint bounds and accepted segments of every apexZ0 covered so far, 
+    #and the union of the accepted segments of the apexZ0 in real_solve
+    apexZ0_covers = [{} for _ in range(wedges)]
+    real_intervals = [{'apexZ0': set(), 'intervals': [np.empty((0, 2)) for _ in z0]} for _ in range(wedges)]
     while reached == False:
         mean_list = np.zeros((len(z0), wedges))
         num_covers = []
         PRF = []
         file = f'python/data/wedgeData_{v}_128.txt'
-        all_data = readFile(file, wedges)
 
-        for k in range(wedges):
-            env, points = all_data[k] 
+        for k, (env, points) in enumerate(iterFile(file, stop=wedges, arrays=True)):
             env = Environment(top_layer_lim=z_top, beam_axis_lim=z0_luminousRegion)
             data = DataSet(env)
             data.importData(points)
             #add the 1 micron points
             data.addBoundaryPoint()
+            x_edges = np.array(env.radii)*(env.top_layer_lim-env.beam_axis_lim)/(env.radii[-1]) + env.beam_axis_lim
+            if incremental:
+                #cover and measure only the apexZ0 not seen before for this wedge
+                for a in np.unique(apexZ0).tolist():
+                    if a not in apexZ0_covers[k]:
+                        cover = cache.solve(env, data, file, k, apexZ0 = [a], lining=lining, ppl = ppl)
+                        apexZ0_covers[k][a] = (cover.n_patches, cover.superpoint_bounds(), parallelogramSegments(cover, z0))
+                for a in np.unique(real_solve).tolist():
+                    if a not in real_intervals[k]['apexZ0']:
+                        real_intervals[k]['apexZ0'].add(a)
+                        real_intervals[k]['intervals'] = [mergeIntervals(real, new) for real, new in zip(real_intervals[k]['intervals'], apexZ0_covers[k][a][2])]
+                tries = [a for a in np.unique(apexZ0).tolist() if a not in real_intervals[k]['apexZ0']]
+                accepted = [mergeIntervals(real, *(apexZ0_covers[k][a][2][iz] for a in tries)) for iz, real in enumerate(real_intervals[k]['intervals'])]
+                mean_list[:, k] = [unionOfLineSegments(segments)/(2.0 * env.top_layer_lim) for segments in accepted]
+                #patches of the separate covers of every apexZ0, so repeats between them are counted more than once
+                num_covers.append(sum(apexZ0_covers[k][a][0] for a in np.unique(apexZ0).tolist()))
+                bounds = np.concatenate([apexZ0_covers[k][a][1] for a in np.unique(apexZ0).tolist()])
+                out = np.concatenate(pointRepetitionFactors(data, bounds, x_edges, 0.1)).tolist()
+                PRF.append(out)
+                continue
+
             #solve for cover
-            cover = wedgeCover(env, data)
-            cover.solve(apexZ0 = apexZ0, lining=lining, ppl = ppl, show = False)
+            cover = cache.solve(env, data, file, k, apexZ0 = apexZ0, lining=lining, ppl = ppl)
             num_covers.append(cover.n_patches)
-            out = [] 
-            x_edges = np.array(env.radii)*(env.top_layer_lim-env.beam_axis_lim)/(env.radii[-1]) + env.beam_axis_lim
-            for layer in range(env.num_layers): 
-                for point in data.array[layer]: 
-                    
-                    num_in = 0
-                    for patch in cover.patches: 
-                        if patch.contains_p(point, layer): 
-                            num_in += 1
-                    if (np.abs(point.z) <= x_edges[layer]+0.1) & (num_in != 0):                       
-                        out.append(num_in)
+            out = np.concatenate(pointRepetitionFactors(data, cover.superpoint_bounds(), x_edges, 0.1)).tolist()
             PRF.append(out)
 
             for iz, z in enumerate(np.array(z0)):
@@ -400,7 +497,7 @@ def minimal_cover_binary_search(lining:str = "makePatches_Projective_center", ac
                 list_of_intersections = []
                 for patch in cover.patches: 
                     list_of_segs = [pgram.crossSection(z) for pgram in patch.parallelograms_v1]
-                    overlap_of_superpoints = intersection(patch.env, list_of_segs) 
+                    overlap_of_superpoints = intersection(patch.env, list_of_segs, True) 
                     list_of_intersections.append(overlap_of_superpoints)
                 
                 total_measure = unionOfLineSegments(list_of_intersections)
@@ -480,11 +577,9 @@ def minimal_cover_binary_search(lining:str = "makePatches_Projective_center", ac
 
 def patch_ending_layer(lining = 'makePatches_Projective_center', apexZ0 = [-10, 0, 10], wedges = 1280, z_5 = 50., v = 'v3'):
     filepath = f"data/wedgeData_{v}_128.txt"
-    filedata = readFile(filepath, stop=wedges, performance=False)
     ends = []
     plt.figure(figsize=(10, 7))
-    for i in range(wedges):
-        env, points = filedata[i]
+    for i, (env, points) in enumerate(iterFile(filepath, stop=wedges, arrays=True)):
         env = Environment(top_layer_lim = z_5)
         ds = DataSet(env)
         ds.importData(points)
@@ -502,7 +597,10 @@ def patch_ending_layer(lining = 'makePatches_Projective_center', apexZ0 = [-10,
     plt.legend(loc = 'upper left', fontsize = 12)
     plt.show()
 
-def minimal_cover_linear_search(lining:str = "makePatches_Projective_center", accept = 0.999, start = 'odd', ppl = 16, wedges = [0, 128], v = 'v3', z_5=100., savefig = False):
+def minimal_cover_linear_search(lining:str = "makePatches_Projective_center", accept = 0.999, start = 'odd', ppl = 16, wedges = [0, 128], v = 'v3', z_5=100., savefig = False, cache = None):
+    # covers already solved in an earlier iteration are taken from cache, a CoverCache that can be shared between calls
+    if cache is None:
+        cache = CoverCache()
 
     if start == 'odd':
         apexZ0 = [0]
@@ -526,30 +624,18 @@ def minimal_cover_linear_search(lining:str = "makePatches_Projective_center", ac
         num_covers = []
         PRF = []
         file = f'python/data/wedgeData_{v}_128.txt'
-        all_data = readFile(file, wedges[1])
 
-        for ik, k in enumerate(np.arange(wedges[0], wedges[1])):
-            env, points = all_data[k] 
+        for ik, (env, points) in enumerate(iterFile(file, start=wedges[0], stop=wedges[1], arrays=True)):
             env = Environment(top_layer_lim=z_5)
             data = DataSet(env)
             data.importData(points)
             #add the 1 micron points
             data.addBoundaryPoint()
             #solve for cover
-            cover = wedgeCover(env, data)
-            cover.solve(apexZ0 = apexZ0, lining=lining, ppl = ppl, show = False)
+            cover = cache.solve(env, data, file, wedges[0] + ik, apexZ0 = apexZ0, lining=lining, ppl = ppl)
             num_covers.append(cover.n_patches)
-            out = [] 
             x_edges = np.array(env.radii)*(env.top_layer_lim-env.beam_axis_lim)/(env.radii[-1]) + env.beam_axis_lim
-            for layer in range(env.num_layers): 
-                for point in data.array[layer]: 
-                    
-                    num_in = 0
-                    for patch in cover.patches: 
-                        if patch.contains_p(point, layer): 
-                            num_in += 1
-                    if (np.abs(point.z) <= x_edges[layer]+0.1) & (num_in != 0):
-                        out.append(num_in)
+            out = np.concatenate(pointRepetitionFactors(data, cover.superpoint_bounds(), x_edges, 0.1)).tolist()
             PRF.append(out)
 
             for iz, z in enumerate(np.array(z0)):
@@ -640,9 +726,7 @@ def numCovers(lining:str = "makePatches_Projective", events=1000, apexZ0 = 0, pp
     """
     num_covers = [] 
     file = f'data/wedgeData_{v}_128.txt'
-    all_data = readFile(file, events)
-    for k in range(events): 
-        env, points = all_data[k] 
+    for k, (env, points) in enumerate(iterFile(file, stop=events, arrays=True)): 
         data = DataSet(env)
         data.importData(points)
         #add the 1 micron points
@@ -688,10 +772,8 @@ def acceptSlopePlot(lining:str = "makePatches_Projective", events=128, lines=100
     
     percentage_accepted = [0 for _ in range(lines)] 
     file = f'data/wedgeData_{v}_128.txt'
-    all_data = readFile(file, events)
     
-    for k in range(events): 
-        env, points = all_data[k] 
+    for k, (env, points) in enumerate(iterFile(file, stop=events, arrays=True)): 
         data = DataSet(env)
         data.importData(points)
         #add the 1 micron points
@@ -701,21 +783,10 @@ def acceptSlopePlot(lining:str = "makePatches_Projective", events=128, lines=100
         cover.solve(lining=lining, apexZ0 = apexZ0, ppl = ppl, show = False)
         
         lg = LineGenerator(env, z0)
-        test_lines = lg.generateEvenGrid(lines)
-        co_tan = []
-        
-        
-        for i in range(len(test_lines)): 
-            color = "r"
-            co_tan.append(100/test_lines[i].slope)
-            for patch in cover.patches: 
-                if patch.contains(test_lines[i]): 
-                    color="g"
-                    percentage_accepted[i] += 1 
-                    break 
-     
-            if color == "r": 
-                pass
+        test_lines, slopes = lg.generateEvenGrid(lines, arrays=True)
+        co_tan = (100/slopes).tolist()
+        accepted, _ = linesAcceptedByPatches(test_lines[:, 1:], cover.superpoint_bounds())
+        percentage_accepted = [x + int(a) for x, a in zip(percentage_accepted, accepted)]
 
     percentage_accepted = [x / events for x in percentage_accepted]
     mean_accept = format(np.mean(percentage_accepted), ".3f")
@@ -754,10 +825,8 @@ def pointRepetitionFactor(lining:str = "makePatches_Projective", events=128, ape
 
     out = []
     file = f'data/wedgeData_{v}_128.txt'
-    all_data = readFile(file, events)
 
-    for k in range(events): 
-        env, points = all_data[k] 
+    for k, (env, points) in enumerate(iterFile(file, stop=events, arrays=True)): 
         data = DataSet(env)
         data.importData(points)
         #add the 1 micron points
@@ -767,19 +836,7 @@ def pointRepetitionFactor(lining:str = "makePatches_Projective", events=128, ape
         cover.solve(lining=lining, apexZ0 = apexZ0, ppl = ppl, show = False)
 
         
-        out2 = [] 
-        
-        for layer in range(env.num_layers): 
-            for point in data.array[layer]: 
-                
-                num_in = 0
-                for patch in cover.patches: 
-                    if patch.contains_p(point, layer): 
-                        num_in += 1
-                        
-                out2.append(num_in) 
-                
-        out += out2
+        out += np.concatenate(pointRepetitionFactors(data, cover.superpoint_bounds())).tolist()
 
     if show == False:
         return (format(np.mean(out), '.2f'), format(np.std(out), '.2f'))
@@ -822,13 +879,11 @@ def pointRepetitionFactorLayer(lining:str = "makePatches_Projective_center", wed
     """
 
     file = f'data/wedgeData_{v}_128.txt'
-    all_data = readFile(file, wedges)
     env = Environment(z_5)
     plt.figure(figsize=(27, 7))
     x_edges = np.array(env.radii)*(env.top_layer_lim-env.beam_axis_lim)/(env.radii[-1]) + env.beam_axis_lim
     out = [[],[],[],[],[]]
-    for k in range(wedges): 
-        env, points = all_data[k] 
+    for k, (env, points) in enumerate(iterFile(file, stop=wedges, arrays=True)): 
         env = Environment(z_5)
         data = DataSet(env)
         data.importData(points)
@@ -839,18 +894,9 @@ def pointRepetitionFactorLayer(lining:str = "makePatches_Projective_center", wed
         cover.solve(lining=lining, apexZ0 = apexZ0, ppl = ppl, show = False)
 
         
-        out2 = [[],[],[],[],[]]
-        
+        out2 = pointRepetitionFactors(data, cover.superpoint_bounds(), x_edges)
         for layer in range(env.num_layers): 
-            for point in data.array[layer]: 
-                
-                num_in = 0
-                for patch in cover.patches:
-                    if patch.contains_p(point, layer): 
-                        num_in += 1        
-                if (np.abs(point.z) <= x_edges[layer]) & (num_in != 0):
-                    out2[layer].append(num_in)
-            out[layer] = out[layer] + out2[layer]
+            out[layer] = out[layer] + out2[layer].tolist()
 
     ylim = max([len(out[x]) for x in range(5)])
     for layer in range(env.num_layers):
@@ -868,3 +914,60 @@ def pointRepetitionFactorLayer(lining:str = "makePatches_Projective_center", wed
         plt.savefig(f"Figures/Point_Repetition_Factor_layer_({lining})")
     plt.show()
 
+def cover_digests(lining = 'makePatches_ShadowQuilt_fromEdges', wedges = 32, seed = 3, apexZ0s = [0, [-10, 0, 10]], ppl = 16, top_layer_cutoff = 50., z0_luminousRegion = 15.):
+    """Solves seeded synthetic wedges and summarizes every cover by its number of patches and a hash of its superpoint bounds
+
+    Returns:
+        dict: [number of patches, sha1 of the bounds] per "apexZ0/wedge", or the name of the exception the solver raised
+    """
+    env = Environment(top_layer_lim = top_layer_cutoff, beam_axis_lim = z0_luminousRegion)
+    events = generateWedges(wedges, env = env, seed = seed)
+    digests = {}
+    for apexZ0 in apexZ0s:
+        for k, hits in enumerate(events):
+            env = Environment(top_layer_lim = top_layer_cutoff, beam_axis_lim = z0_luminousRegion)
+            data = DataSet(env)
+            data.importData(hits)
+            data.addBoundaryPoint()
+            cover = wedgeCover(env, data)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    cover.solve(apexZ0 = apexZ0, lining = lining, ppl = ppl, show = False)
+            except IndexError as error:
+                # the known failure of fromEdges on a few wedges is part of its output too
+                digests[f'{apexZ0}/{k}'] = type(error).__name__
+                continue
+            bounds = np.array([[[sp.min, sp.max] for sp in patch.superpoints] for patch in cover.patches], dtype=float)
+            digests[f'{apexZ0}/{k}'] = [len(cover.patches), hashlib.sha1(bounds.tobytes()).hexdigest()]
+    return digests
+
+def cover_regression(reference = 'python/data/fromEdges_reference.json', write = False):
+    """Checks that a lining still makes exactly the patches of a reference run on seeded synthetic wedges
+
+    The bundled reference holds the makePatches_ShadowQuilt_fromEdges covers from before its white space and
+    horizontal shift loops evaluated candidate patches instead of adding and deleting them.
+
+    Args:
+        reference (str, optional): JSON file with the settings of cover_digests and their digests. 
+            Defaults to 'python/data/fromEdges_reference.json'.
+        write (bool, optional): True to write the digests of the current code to reference instead. Defaults to False.
+
+    Returns:
+        dict: digests of the covers of the current code, see cover_digests
+    """
+    if write == True:
+        settings = {'lining': 'makePatches_ShadowQuilt_fromEdges', 'wedges': 32, 'seed': 3, 'apexZ0s': [0, [-10, 0, 10]], 
+                    'ppl': 16, 'top_layer_cutoff': 50., 'z0_luminousRegion': 15.}
+        with open(reference, 'w') as f:
+            digests = cover_digests(**settings)
+            json.dump({'settings': settings, 'digests': digests}, f, indent=1)
+        return digests
+
+    with open(reference) as f:
+        stored = json.load(f)
+    digests = cover_digests(**stored['settings'])
+    changed = {key: (stored['digests'][key], digests.get(key)) for key in stored['digests'] if digests.get(key) != stored['digests'][key]}
+    if len(changed) > 0:
+        raise Exception(f"{stored['settings']['lining']} changed the covers of {len(changed)} wedges: {changed}")
+    print(f"{stored['settings']['lining']} makes the reference covers of all {len(digests)} wedges.")
+    return digests